@@ -0,0 +1,351 @@
+"""
+Banc d'essai de la couche de données de streamlit_app.py, sans Google Sheets.
+
+Un faux backend gspread (onglets en mémoire, latence simulée par appel, quota
+d'appels par fenêtre glissante -> erreur 429) remplace le classeur ; des jeux
+DATA / REFUS / TRANSPORT / PDC sont générés à la taille demandée. Pour chaque
+opération : durée, appels API, réponses 429 et pic mémoire (tracemalloc).
+
+    python benchmarks/bench_data_layer.py                     # 1k, 10k, 100k lignes
+    python benchmarks/bench_data_layer.py --sizes 1000 --latency 0 --csv bench.csv
+"""
+import argparse
+import io
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import warnings
+from collections import deque
+
+warnings.filterwarnings("ignore")
+logging.disable(logging.WARNING)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import gspread  # noqa: E402
+import openpyxl  # noqa: E402
+import pandas as pd  # noqa: E402
+import streamlit_app as app  # noqa: E402
+
+MAGASINS = ['BAYONNE', 'BIDART', 'URRUGNE', 'PMI']
+FOURNISSEURS = [f"FOURNISSEUR {i:03d}" for i in range(150)]
+STATUTS = ['À déballer', 'EN COURS', 'TERMINEE', 'LITIGE', 'Clôturé']
+
+
+# --- FAUX BACKEND GSPREAD ---
+class _QuotaResponse:
+    """Réponse HTTP minimale attendue par gspread.exceptions.APIError."""
+    status_code = 429
+    text = "Quota exceeded"
+
+    def json(self):
+        return {'error': {'code': 429, 'message': self.text, 'status': 'RESOURCE_EXHAUSTED'}}
+
+
+class FakeBackend:
+    """Compteurs et quota partagés par tous les onglets (comme un projet Google Cloud)."""
+
+    def __init__(self, latency=0.05, quota=300, window=60.0):
+        self.latency, self.quota, self.window = latency, quota, window
+        self.calls = 0
+        self.rejected = 0
+        self.revision = 0  # incrémenté à chaque écriture (date de modification du classeur)
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def call(self):
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > self.window:
+                self._recent.popleft()
+            if self.quota and len(self._recent) >= self.quota:
+                self.rejected += 1
+                raise gspread.exceptions.APIError(_QuotaResponse())
+            self._recent.append(now)
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def reset_counters(self):
+        self.calls = self.rejected = 0
+
+    def write(self):
+        self.call()
+        self.revision += 1
+
+
+class FakeSpreadsheet:
+    """Classeur : seule la date de modification (API Drive) est utilisée."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get_lastUpdateTime(self):
+        self.backend.call()
+        return f"2026-01-01T00:00:00.{self.backend.revision:06d}Z"
+
+
+class FakeWorksheet:
+    """Onglet en mémoire : sous-ensemble de l'API gspread utilisé par l'application."""
+
+    def __init__(self, backend, title, rows):
+        self.backend, self.title = backend, title
+        self.rows = [list(r) for r in rows]
+
+    @property
+    def col_count(self):
+        return max((len(r) for r in self.rows), default=1)
+
+    def get_all_values(self):
+        self.backend.call()
+        return [list(r) for r in self.rows]
+
+    def get(self, a1_range, **kwargs):
+        self.backend.call()
+        start, _ = gspread.utils.a1_to_rowcol(a1_range.split(':')[0])
+        return [list(r) for r in self.rows[start - 1:]]
+
+    def batch_get(self, ranges, **kwargs):
+        self.backend.call()
+        rows = [int(r.split(':')[0]) for r in ranges]
+        return [[list(self.rows[r - 1])] if r <= len(self.rows) else [] for r in rows]
+
+    def row_values(self, row):
+        self.backend.call()
+        return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+    def append_rows(self, values, **kwargs):
+        self.backend.write()
+        start = len(self.rows) + 1
+        self.rows.extend([str(v) for v in r] for r in values)
+        return {'updates': {'updatedRange': f"'{self.title}'!A{start}", 'updatedRows': len(values)}}
+
+    def batch_update(self, data, **kwargs):
+        self.backend.write()
+        for update in data:
+            row0, col0 = gspread.utils.a1_to_rowcol(update['range'].split(':')[0])
+            for r_off, values in enumerate(update['values']):
+                while len(self.rows) < row0 + r_off:
+                    self.rows.append([])
+                row = self.rows[row0 - 1 + r_off]
+                for c_off, value in enumerate(values):
+                    col = col0 - 1 + c_off
+                    row.extend([''] * (col + 1 - len(row)))
+                    row[col] = str(value)
+        return {'totalUpdatedRows': sum(len(u['values']) for u in data)}
+
+    def batch_clear(self, ranges):
+        self.backend.write()
+
+    def update(self, *args, **kwargs):
+        self.backend.write()
+        values = args[0] if args and isinstance(args[0], list) else (args[1] if len(args) > 1 else kwargs.get('values'))
+        self.rows = [list(map(str, r)) for r in values]
+
+    def clear(self):
+        self.backend.write()
+        self.rows = []
+
+
+# --- JEUX DE DONNÉES ---
+def make_datasets(n, seed=0):
+    rng = random.Random(seed)
+    data = [app.COLUMNS_DATA]
+    for i in range(n):
+        statut = rng.choice(STATUTS)
+        data.append([
+            str(100000 + i), rng.choice(MAGASINS), rng.choice(FOURNISSEURS), str(rng.randint(1, 9999)),
+            f"{rng.uniform(10, 5000):.2f}", f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            str(rng.randint(1, 200)), rng.choice(['PE26', 'AH26', '']), f"FA{i}", statut,
+            rng.choice(['', 'A1', 'A2', 'B1', 'QUAI']), rng.choice(['', 'Léa', 'Marc']), '',
+            'OUI' if statut == 'LITIGE' else '', '', '',
+        ])
+    refus = [app.COLUMNS_REFUS] + [
+        [rng.choice(MAGASINS), f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+         rng.choice(FOURNISSEURS), f"BL{i}", "Colis abîmé"] for i in range(n)
+    ]
+    transport = [app.COLUMNS_TRANSPORT] + [
+        [str(i + 1), rng.choice(MAGASINS), rng.choice(['DHL', 'GEODIS', 'SCHENKER']), str(rng.randint(1, 30)),
+         str(rng.randint(10, 900)), '', rng.choice(['OUI', 'NON']), rng.choice(['OUI', 'NON'])] for i in range(n)
+    ]
+    pdc = [app.COLUMNS_PDC] + [
+        [rng.choice(FOURNISSEURS), f"BL{i}", f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", '',
+         'Jean', 'jean@example.com', '', str(rng.randint(0, 5))] for i in range(n)
+    ]
+    mails = [['Nom', 'Mail'], ['Jean', 'jean@example.com']]
+    return {app.WS_DATA: data, app.WS_REFUS: refus, app.WS_TRANSPORT: transport, app.WS_PDC: pdc, app.WS_MAILS: mails}
+
+
+def make_import_file(first_num, n, duplicates):
+    """Fichier Excel d'import : n lignes dont `duplicates` numéros déjà présents en base."""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(list(app.COLUMN_MAPPING.keys()))
+    for i in range(n):
+        num = 100000 + i if i < duplicates else first_num + i
+        ws.append([num, 'BAYONNE', 'FOURNISSEUR 001', '42', 123.45, '2026-10-01', 3])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    upload = io.BytesIO(buffer.getvalue())
+    upload.name = 'import.xlsx'
+    return upload
+
+
+# --- INSTALLATION DANS L'APPLICATION ---
+def install(backend, datasets, workdir):
+    """Branche l'application sur le faux classeur, avec cache, copie locale et traces neufs."""
+    sheets = {name: FakeWorksheet(backend, name, rows) for name, rows in datasets.items()}
+    cache = app.WorksheetCache()
+    mirror = app.LocalMirror(os.path.join(workdir, 'mirror.sqlite'), list(sheets), on_change=cache.invalidate)
+    aggregates = app.DashboardAggregates()
+    mirror.add_row_listener(aggregates.on_rows)
+    tracer = app.Tracer(os.path.join(workdir, 'traces.jsonl'))
+    # Ordonnanceur réglé comme en production, sur le quota simulé (sans limite si quota = 0)
+    scheduler = app.ApiScheduler(backend.quota or 10 ** 9, backend.window)
+    app.get_gsheet_client = lambda: object()
+    app.get_worksheet = lambda name: sheets[name]
+    app.get_spreadsheet = lambda: FakeSpreadsheet(backend)
+    app.get_worksheet_cache = lambda: cache
+    app.get_mirror = lambda: mirror
+    app.get_dashboard_aggregates = lambda: aggregates
+    app.get_tracer = lambda: tracer
+    app.get_api_scheduler = lambda: scheduler
+    return sheets, mirror
+
+
+# --- MESURES ---
+def measure(backend, name, size, func, track_memory=True):
+    backend.reset_counters()
+    if track_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    error = ''
+    try:
+        func()
+    except Exception as e:
+        error = str(e)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1e6 if track_memory else float('nan')
+    if track_memory:
+        tracemalloc.stop()
+    return {
+        'lignes': size, 'opération': name, 'durée (s)': round(elapsed, 3),
+        'appels API': backend.calls, '429': backend.rejected, 'pic mémoire (Mo)': round(peak, 1), 'erreur': error,
+    }
+
+
+def run_size(n, args):
+    backend = FakeBackend(args.latency, args.quota, args.window)
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    sheets, mirror = install(backend, make_datasets(n), workdir)
+    rng = random.Random(1)
+    mem = not args.no_memory
+    results = []
+
+    def op(name, func):
+        results.append(measure(backend, name, n, func, mem))
+        print(f"  {name:<45} {results[-1]['durée (s)']:>8.3f} s  {results[-1]['appels API']:>4} appels", flush=True)
+
+    def edit_status():
+        df = app.load_data(app.WS_DATA, ['NumReception', 'StatutBL'])
+        sample = df.sample(max(1, n // 100), random_state=1)
+        edits = [app.CellEdit(key, 'StatutBL', old, 'TERMINEE') for key, old in zip(sample['NumReception'], sample['StatutBL'])]
+        result = app.save_cell_edits(app.WS_DATA, edits)
+        assert result.ok, result
+
+    def send_locations():
+        # Écriture seule (sans relecture de contrôle) : 100 cellules en un batch_update
+        rows = app.get_row_index(app.WS_DATA, 'NumReception').iloc[:100] + 2
+        col = app.get_header_map(app.WS_DATA)['Emplacement'] + 1
+        app._send_diff(app.WS_DATA, [
+            {'range': gspread.utils.rowcol_to_a1(int(row), col), 'values': [[rng.choice(['C1', 'C2', 'C3'])]]} for row in rows
+        ])
+
+    def edit_cells():
+        df = app.load_data(app.WS_DATA, ['NumReception', 'Emplacement'], where={'StatutBL': 'À déballer'}).head(100)
+        edits = [app.CellEdit(key, 'Emplacement', old, rng.choice(['D1', 'D2', 'D3']))
+                 for key, old in zip(df['NumReception'], df['Emplacement'])]
+        result = app.save_cell_edits(app.WS_DATA, edits)
+        assert result.ok and not result.conflicts, result
+
+    def tail_sync():
+        # Lignes ajoutées par un autre poste
+        sheets[app.WS_DATA].rows.extend([str(900000 + i), 'PMI'] + [''] * 14 for i in range(10))
+        backend.revision += 1
+        mirror.sync_once()
+
+    def concurrent_reads(sessions=8):
+        # Plusieurs sessions relisent le même onglet au même moment : un seul appel
+        barrier = threading.Barrier(sessions)
+
+        def read():
+            barrier.wait()
+            mirror.pull(app.WS_REFUS, full=True)
+        threads = [threading.Thread(target=read) for _ in range(sessions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    import_file = make_import_file(100000 + n, 1000, duplicates=100)
+
+    def import_check():
+        existing = app.get_key_index(app.WS_DATA, 'NumReception')
+        accepted, report = app.import_excel_file(import_file, existing)
+        assert len(accepted) == 900, len(accepted)
+
+    op("load_data DATA (copie locale vide)", lambda: app.load_data(app.WS_DATA, app.COLUMNS_DATA))
+    op("load_data DATA (cache)", lambda: app.load_data(app.WS_DATA, app.COLUMNS_DATA))
+    op("load_data DATA typé", lambda: app.load_data(app.WS_DATA, app.COLUMNS_DATA, typed=True))
+    op("load_data REFUS", lambda: app.load_data(app.WS_REFUS, app.COLUMNS_REFUS))
+    op("load_data TRANSPORT", lambda: app.load_data(app.WS_TRANSPORT, app.COLUMNS_TRANSPORT))
+    op("load_data PDC", lambda: app.load_data(app.WS_PDC, app.COLUMNS_PDC))
+    mirror.sync_once()  # premier passage du worker : date de modification mémorisée
+    op("synchro (classeur inchangé)", mirror.sync_once)
+    op("synchro incrémentale (+10 lignes)", tail_sync)
+    op("8 lectures simultanées (REFUS)", concurrent_reads)
+    # Onglet complet plus en mémoire : colonnes et lignes lues dans la copie locale
+    op("load_data DATA (2 colonnes)", lambda: app.load_data(app.WS_DATA, ['NumReception', 'StatutBL']))
+    op("load_data DATA (À déballer)", lambda: app.load_data(app.WS_DATA, app.COLUMNS_DATA, where={'StatutBL': 'À déballer'}))
+    op("load_data DATA (10 dernières)", lambda: app.load_data(app.WS_DATA, app.COLUMNS_DATA, typed=True, limit=10))
+    op("tableau de bord (agrégats)", app.dashboard_summary)
+    op("save_cell_edits (1 % de statuts)", edit_status)
+    op("_send_diff (100 cellules)", send_locations)
+    op("saisie cellule par cellule (100 cellules)", edit_cells)
+    op("import : contrôle doublons (1k lignes)", import_check)
+    op("append_rows_gsheet (1k lignes)", lambda: app.append_rows_gsheet(
+        app.WS_DATA, pd.DataFrame([[str(800000 + i), 'PMI'] for i in range(1000)], columns=['NumReception', 'Magasin'])))
+    mirror.db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai de la couche de données (faux Google Sheets)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--latency', type=float, default=0.05, help="latence simulée par appel API (s)")
+    parser.add_argument('--quota', type=int, default=300, help="appels autorisés par fenêtre (0 = illimité)")
+    parser.add_argument('--window', type=float, default=60.0, help="durée de la fenêtre de quota (s)")
+    parser.add_argument('--no-memory', action='store_true', help="sans tracemalloc (durées plus justes)")
+    parser.add_argument('--csv', help="fichier CSV où écrire les résultats")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.sizes:
+        print(f"== {n} lignes", flush=True)
+        results.extend(run_size(n, args))
+    report = pd.DataFrame(results)
+    print()
+    print(report.to_string(index=False))
+    if args.csv:
+        report.to_csv(args.csv, index=False)
+
+
+if __name__ == "__main__":
+    main()
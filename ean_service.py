@@ -0,0 +1,239 @@
+"""
+Service de recherche produit (EAN / Chrono) pour les pages scanner index.html et TEST.html.
+
+Le catalogue est chargé une fois en mémoire puis indexé par EAN, par code Chrono et
+par magasin : une recherche est une lecture de dictionnaire (< 1 ms) au lieu d'un
+appel complet au script Apps Script. Un thread de fond ajoute les nouvelles lignes
+du catalogue (lecture de la fin de l'onglet) et recharge tout régulièrement pour
+suivre les changements de stock.
+
+Lancement :
+    python ean_service.py --port 8502
+
+Les pages scanner interrogent ce service (paramètre ?lookup=http://hote:8502 dans
+l'URL de la page) et repassent sur le script Apps Script s'il ne répond pas.
+Mêmes paramètres et même réponse que le script : ean, chronoCode, magasin ->
+liste JSON de produits (10 au plus).
+"""
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+import tomllib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import gspread
+
+# --- CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Même classeur que streamlit_app.py, onglet du catalogue produits
+SHEET_ID = os.environ.get("CATALOGUE_SHEET_ID", "1JT_Lq_TvPL2lQc2ArPBi48bVKdSgU2m_SyPFHSQsGtk")
+WS_CATALOGUE = os.environ.get("CATALOGUE_WS", "CATALOGUE")
+# Fichier CSV exporté du catalogue, utilisé à la place de Google Sheets s'il est fourni
+CATALOGUE_CSV = os.environ.get("CATALOGUE_CSV", "")
+
+# Nombre maximum de résultats renvoyés (LIMIT 10 côté script)
+MAX_RESULTS = 10
+# Ajout des nouvelles lignes (s) et rechargement complet pour les stocks (s)
+REFRESH_INTERVAL = 30
+FULL_REFRESH_INTERVAL = 10 * 60
+
+
+def _load_credentials():
+    """Compte de service : section [gspread] des secrets Streamlit, sinon credentials.json."""
+    secrets_path = os.path.join(BASE_DIR, ".streamlit", "secrets.toml")
+    if os.path.exists(secrets_path):
+        with open(secrets_path, "rb") as f:
+            secrets = tomllib.load(f)
+        if "gspread" in secrets:
+            creds = dict(secrets["gspread"])
+            creds['private_key'] = creds['private_key'].replace('\\n', '\n')
+            return creds
+    with open(os.path.join(BASE_DIR, "credentials.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _clean(value):
+    """Clé de recherche normalisée (espaces retirés, « 123.0 » -> « 123 »)."""
+    text = str(value).strip()
+    if text.endswith('.0') and text[:-2].isdigit():
+        text = text[:-2]
+    return text
+
+
+class CatalogueIndex:
+    """
+    Catalogue en mémoire indexé par EAN, Chrono et magasin. Les produits sont des
+    dictionnaires prêts à être renvoyés en JSON ; les index pointent sur ces mêmes
+    objets. Un rechargement complet construit de nouveaux index puis les échange
+    d'un bloc, les lectures ne sont jamais bloquées longtemps.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._header = []
+        self._row_count = 0
+        self._by_ean = {}
+        self._by_chrono = {}
+        self._by_magasin = {}
+        self.loaded_at = None
+
+    def _index_rows(self, header, rows, by_ean, by_chrono, by_magasin):
+        for row in rows:
+            item = {col: (row[i] if i < len(row) else '') for i, col in enumerate(header)}
+            if not any(item.values()):
+                continue
+            if item.get('EAN'):
+                by_ean.setdefault(_clean(item['EAN']), []).append(item)
+            if item.get('Chrono'):
+                by_chrono.setdefault(_clean(item['Chrono']), []).append(item)
+            by_magasin.setdefault(str(item.get('Magasin', '')).strip().upper(), []).append(item)
+
+    def replace(self, values):
+        """Remplace tout le catalogue (en-tête + lignes)."""
+        header = [str(h).strip() for h in values[0]] if values else []
+        by_ean, by_chrono, by_magasin = {}, {}, {}
+        self._index_rows(header, values[1:], by_ean, by_chrono, by_magasin)
+        with self._lock:
+            self._header = header
+            self._row_count = max(len(values) - 1, 0)
+            self._by_ean, self._by_chrono, self._by_magasin = by_ean, by_chrono, by_magasin
+            self.loaded_at = time.time()
+
+    def extend(self, rows):
+        """Ajoute des lignes lues à la suite du catalogue."""
+        with self._lock:
+            self._index_rows(self._header, rows, self._by_ean, self._by_chrono, self._by_magasin)
+            self._row_count += len(rows)
+            self.loaded_at = time.time()
+
+    @property
+    def row_count(self):
+        return self._row_count
+
+    @property
+    def width(self):
+        return len(self._header)
+
+    def lookup(self, ean=None, chrono=None, magasin=None, limit=MAX_RESULTS):
+        """Même logique que le script : EAN, sinon Chrono, sinon tous les produits si magasin=TOUS."""
+        magasin = (magasin or '').strip().upper()
+        with self._lock:
+            if ean:
+                items = self._by_ean.get(_clean(ean), [])
+            elif chrono:
+                items = self._by_chrono.get(_clean(chrono), [])
+            elif magasin == 'TOUS':
+                items = [item for group in self._by_magasin.values() for item in group[:limit]]
+            else:
+                return []
+            if magasin and magasin != 'TOUS':
+                items = [item for item in items if str(item.get('Magasin', '')).strip().upper() == magasin]
+            return items[:limit]
+
+
+class CatalogueSource:
+    """Lecture du catalogue : onglet Google Sheets (complet ou fin d'onglet) ou export CSV."""
+
+    def __init__(self, csv_path=CATALOGUE_CSV):
+        self.csv_path = csv_path
+        self._ws = None
+
+    def _worksheet(self):
+        if self._ws is None:
+            client = gspread.service_account_from_dict(_load_credentials())
+            self._ws = client.open_by_key(SHEET_ID).worksheet(WS_CATALOGUE)
+        return self._ws
+
+    def read_all(self):
+        if self.csv_path:
+            with open(self.csv_path, newline='', encoding='utf-8-sig') as f:
+                dialect = csv.Sniffer().sniff(f.readline(), delimiters=';,\t')
+                f.seek(0)
+                return list(csv.reader(f, dialect))
+        return self._worksheet().get_all_values()
+
+    def read_after(self, row_count, width):
+        """Lignes situées après les row_count premières lignes de données (en-tête exclu)."""
+        if self.csv_path:
+            return self.read_all()[row_count + 1:]
+        last_col = gspread.utils.rowcol_to_a1(1, max(width, 1)).rstrip('0123456789')
+        return self._worksheet().get(f"A{row_count + 2}:{last_col}")
+
+
+class CatalogueRefresher(threading.Thread):
+    """Thread de fond : ajout des nouvelles lignes, puis rechargement complet périodique."""
+
+    def __init__(self, index, source, interval=REFRESH_INTERVAL, full_interval=FULL_REFRESH_INTERVAL):
+        super().__init__(daemon=True)
+        self.index, self.source = index, source
+        self.interval, self.full_interval = interval, full_interval
+        self._last_full = 0.0
+
+    def refresh_once(self):
+        if time.time() - self._last_full >= self.full_interval or not self.index.width:
+            self.index.replace(self.source.read_all())
+            self._last_full = time.time()
+        else:
+            rows = self.source.read_after(self.index.row_count, self.index.width)
+            if rows:
+                self.index.extend(rows)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh_once()
+            except Exception as e:
+                print(f"[ean_service] Rafraîchissement impossible : {e}", flush=True)
+
+
+def make_handler(index):
+    class LookupHandler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            # Les pages scanner sont servies depuis une autre origine
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path == '/health':
+                self._send(200, {'rows': index.row_count, 'loaded_at': index.loaded_at})
+                return
+            if index.loaded_at is None:
+                self._send(503, {'error': "Catalogue en cours de chargement"})
+                return
+            self._send(200, index.lookup(params.get('ean'), params.get('chronoCode'), params.get('magasin')))
+
+        def log_message(self, format, *args):
+            # Pas de journal par requête : un scan doit rester sous la milliseconde
+            pass
+    return LookupHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service de recherche produit pour les pages scanner")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--csv', default=CATALOGUE_CSV, help="Export CSV du catalogue à la place de Google Sheets")
+    args = parser.parse_args()
+
+    index = CatalogueIndex()
+    refresher = CatalogueRefresher(index, CatalogueSource(args.csv))
+    refresher.refresh_once()
+    refresher.start()
+    print(f"[ean_service] {index.row_count} produits chargés, écoute sur {args.host}:{args.port}", flush=True)
+    ThreadingHTTPServer((args.host, args.port), make_handler(index)).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
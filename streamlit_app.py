@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 import gspread
 import streamlit as st
 from datetime import datetime
@@ -6,12 +7,32 @@ import requests
 import smtplib
 import re
 import io
+import time
+import random
+import threading
+import os
+import json
+import uuid
+import hashlib
+import heapq
+import sqlite3
+import fnmatch
+import functools
+import importlib
+import itertools
+import sys
+import openpyxl
+import xlrd
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
 from email.header import Header
-from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, DataReturnMode
+from google.auth.exceptions import RefreshError
+from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, DataReturnMode, JsCode
 
 # --- CONFIGURATION & CONSTANTES ---
 SHEET_ID = '1JT_Lq_TvPL2lQc2ArPBi48bVKdSgU2m_SyPFHSQsGtk'
@@ -21,6 +42,8 @@ WS_MAILS = 'MAIL' # Onglet contenant la liste des destinataires
 WS_TRANSPORT = 'TRANSPORT'
 WS_PDC = 'PDC'
 apiKey = "" # La clé API est injectée automatiquement par l'environnement
+# Dossier des fichiers locaux de l'application (non versionné)
+LOCAL_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'local_store')
 
 # ONGLET DATA
 COLUMNS_DATA = [
@@ -54,70 +77,1429 @@ COLUMNS_PDC = [
     'mail acheteur', 'date relance', 'Nombre de relance'
 ]
 
+# --- TRACES D'EXÉCUTION ---
+TRACE_LOG_PATH = os.path.join(LOCAL_STORE_DIR, 'traces.jsonl')
+TRACE_KEEP = 5000                 # spans gardés en mémoire pour la page de diagnostic
+TRACE_LOG_MAX_BYTES = 5_000_000   # au-delà, le journal est renommé en .1 et recommencé
+TRACE_BACKGROUND = "arrière-plan"
+
+class Tracer:
+    """
+    Mesures légères par rerun. Chaque span (fonction tracée, appel Google Sheets)
+    note sa durée, sa taille (lignes pour les onglets, caractères pour les mails et
+    l'IA) et le nombre d'appels API faits pendant son exécution, sous-spans compris.
+    Les spans restent en mémoire pour la page de diagnostic et sont ajoutés à
+    TRACE_LOG_PATH (une ligne JSON par span) pour suivre la consommation de quota.
+    Les threads de fond (synchro, envois) sont rangés sous le run « arrière-plan ».
+    """
+    def __init__(self, path=TRACE_LOG_PATH, keep=TRACE_KEEP):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.spans = deque(maxlen=keep)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def _state(self):
+        state = self.local
+        if not hasattr(state, 'stack'):
+            state.stack, state.run, state.page = [], None, None
+        return state
+
+    def current_run(self):
+        return self._state().run
+
+    @contextmanager
+    def run(self, page):
+        """Regroupe les spans d'un rerun de la page sous un même identifiant."""
+        state = self._state()
+        state.run, state.page = uuid.uuid4().hex[:8], page
+        try:
+            with self.span('rerun', page):
+                yield state.run
+        finally:
+            state.run = state.page = None
+
+    @contextmanager
+    def span(self, name, target=''):
+        state = self._state()
+        record = {
+            'run': state.run or TRACE_BACKGROUND, 'page': state.page or '', 'name': name,
+            'target': str(target), 'api_calls': 0, 'size': None, 'ok': True,
+        }
+        state.stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception:
+            record['ok'] = False
+            raise
+        finally:
+            record['ms'] = round((time.perf_counter() - start) * 1000, 2)
+            record['ts'] = time.time()
+            state.stack.pop()
+            if state.stack:
+                state.stack[-1]['api_calls'] += record['api_calls']
+            self._record(record)
+
+    def _record(self, record):
+        with self.lock:
+            self.spans.append(record)
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) > TRACE_LOG_MAX_BYTES:
+                    os.replace(self.path, self.path + '.1')
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            except OSError:
+                pass
+
+    def frame(self, run=None):
+        """Spans en mémoire (d'un run donné ou tous) sous forme de DataFrame."""
+        with self.lock:
+            spans = [s for s in self.spans if run is None or s['run'] == run]
+        return pd.DataFrame(spans, columns=['ts', 'run', 'page', 'name', 'target', 'ms', 'api_calls', 'size', 'ok'])
+
+@st.cache_resource(show_spinner=False)
+def get_tracer():
+    return Tracer()
+
+def traced(name=None, target=None, size=None):
+    """
+    Décorateur : exécute la fonction dans un span. target(*args, **kwargs) donne
+    l'objet visé (onglet...), size(args, kwargs, résultat) la taille traitée.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_tracer().span(name or func.__name__, target(*args, **kwargs) if target else '') as record:
+                result = func(*args, **kwargs)
+                if size:
+                    try:
+                        record['size'] = size(args, kwargs, result)
+                    except Exception:
+                        pass
+                return result
+        return wrapper
+    return decorator
+
+def _payload_rows(result):
+    """Nombre de lignes lues ou écrites d'après la réponse de gspread."""
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        updates = result.get('updates', result)
+        return updates.get('updatedRows', updates.get('totalUpdatedRows'))
+    return None
+
+def _first_len(args, kwargs, result):
+    return len(args[1])
+
 # --- FONCTIONS TECHNIQUES ---
+# Durée de vie du client partagé : inférieure à celle d'un jeton OAuth (1h)
+GSHEET_CLIENT_TTL = 45 * 60
+# Secondes avant de relister les onglets du classeur
+WORKSHEETS_TTL = 600
+
+class GSheetConfigError(Exception):
+    """Secrets 'gspread' absents ou incomplets."""
+
+@st.cache_resource(ttl=GSHEET_CLIENT_TTL, show_spinner=False)
+@traced('auth')
+def get_gsheet_client():
+    """
+    Client gspread unique pour tout le processus (partagé entre sessions et reruns).
+    Le jeton est rafraîchi automatiquement par google-auth ; le TTL force en plus
+    une ré-authentification complète régulière.
+    """
+    if 'gspread' not in st.secrets:
+        raise GSheetConfigError("Les secrets 'gspread' ne sont pas configurés dans Streamlit Cloud.")
+    creds = dict(st.secrets['gspread'])
+    creds['private_key'] = creds['private_key'].replace('\\n', '\n')
+    return gspread.service_account_from_dict(creds)
+
+@st.cache_resource(ttl=GSHEET_CLIENT_TTL, show_spinner=False)
+def get_spreadsheet():
+    """Classeur SHEET_ID ouvert une seule fois par processus."""
+    return get_gsheet_client().open_by_key(SHEET_ID)
+
+@st.cache_resource(ttl=GSHEET_CLIENT_TTL, show_spinner=False)
+def get_worksheet(ws_name):
+    """Onglet ouvert une seule fois par processus (évite les appels de métadonnées)."""
+    return get_spreadsheet().worksheet(ws_name)
+
+def invalidate_gsheet_connection():
+    """Oublie client, classeur et onglets : la prochaine requête se ré-authentifie."""
+    get_worksheet.clear()
+    get_spreadsheet.clear()
+    get_gsheet_client.clear()
+
+def _is_auth_error(e):
+    """Vrai si l'erreur justifie une nouvelle authentification (jeton expiré / révoqué)."""
+    if isinstance(e, RefreshError):
+        return True
+    if isinstance(e, gspread.exceptions.APIError):
+        return e.code in (401, 403)
+    return False
+
+def run_on_worksheet(ws_name, operation, priority=None, key=None):
+    """
+    Point d'entrée unique vers Google Sheets : exécute operation(ws) sur l'onglet
+    mis en cache (ws_name=None : operation reçoit le classeur, pour ses métadonnées).
+    L'appel passe par l'ordonnanceur (get_api_scheduler) avec la priorité donnée ;
+    key identifie une lecture que des appels simultanés peuvent partager.
+    En cas d'erreur d'authentification, la connexion est invalidée puis l'opération
+    est rejouée une fois.
+    """
+    tracer = get_tracer()
+    scheduler = get_api_scheduler()
+    target = ws_name or "classeur"
+    def _operation():
+        return operation(get_worksheet(ws_name) if ws_name else get_spreadsheet())
+    try:
+        with tracer.span('sheets_api', target) as record:
+            record['api_calls'] = 1
+            result = scheduler.call(_operation, priority, key)
+            record['size'] = _payload_rows(result)
+            return result
+    except Exception as e:
+        if not _is_auth_error(e):
+            raise
+        invalidate_gsheet_connection()
+        with tracer.span('sheets_api', target) as record:
+            record['api_calls'] = 1
+            result = scheduler.call(_operation, priority, key)
+            record['size'] = _payload_rows(result)
+            return result
+
+@st.cache_resource(ttl=WORKSHEETS_TTL, show_spinner=False)
+def get_spreadsheet_tabs():
+    """(titre du classeur, titres des onglets) : un seul appel de métadonnées, mis en cache."""
+    return run_on_worksheet(None, lambda spreadsheet: (spreadsheet.title, tuple(ws.title for ws in spreadsheet.worksheets())),
+                            key=('worksheets',))
+
+def create_worksheet(ws_name, header):
+    """Crée un onglet avec sa ligne d'en-tête, puis oublie la liste des onglets en cache."""
+    def _create(spreadsheet):
+        spreadsheet.add_worksheet(title=ws_name, rows=100, cols=len(header)).update('A1', [header])
+    run_on_worksheet(None, _create, priority=PRIORITY_WRITE)
+    get_spreadsheet_tabs.clear()
+
 def authenticate_gsheet():
     try:
-        if 'gspread' not in st.secrets:
-            st.error("❌ Les secrets 'gspread' ne sont pas configurés dans Streamlit Cloud.")
-            return None
-        creds = dict(st.secrets['gspread'])
-        creds['private_key'] = creds['private_key'].replace('\\n', '\n')
-        return gspread.service_account_from_dict(creds)
+        return get_gsheet_client()
+    except GSheetConfigError as e:
+        st.error(f"❌ {e}")
+        return None
     except Exception as e:
         st.error(f"❌ Erreur d'authentification : {e}")
         return None
 
-def load_data(ws_name, cols):
-    """Charge les données d'un onglet en ignorant les colonnes vides dupliquées."""
+def get_setting(name, default):
+    """Paramètre optionnel lu dans la section [app] des secrets Streamlit."""
     try:
-        gc = authenticate_gsheet()
-        if not gc: return pd.DataFrame(columns=cols)
-        sh = gc.open_by_key(SHEET_ID)
-        ws = sh.worksheet(ws_name)
+        return type(default)(st.secrets.get("app", {}).get(name, default))
+    except Exception:
+        return default
+
+# --- ORDONNANCEUR DES APPELS GOOGLE SHEETS ---
+# Quota Google Sheets : 60 requêtes par minute et par utilisateur (le compte de service)
+API_QUOTA = 60            # appels autorisés par fenêtre (secrets : [app] api_quota)
+API_QUOTA_WINDOW = 60     # durée de la fenêtre de quota (s)
+API_BURST = 30            # jetons accumulables pour une rafale, compris dans le quota (secrets : [app] api_burst)
+API_MAX_WAIT = 60         # attente maximale d'un jeton (s) avant d'abandonner l'appel
+API_QUOTA_RETRIES = 4     # nouveaux essais après une erreur 429
+API_QUOTA_BACKOFF = 2.0   # pause globale (s) après une erreur 429, doublée à chaque nouvelle erreur
+# Priorités : la plus petite valeur passe en premier
+PRIORITY_WRITE = 0        # saisies des formulaires et des grilles
+PRIORITY_READ = 1         # lectures des pages
+PRIORITY_BACKGROUND = 2   # synchro de la copie locale, relances
+
+class ApiBusyError(TimeoutError):
+    """Pas de jeton dans le délai : traité comme une indisponibilité passagère (file locale)."""
+
+class _SharedCall:
+    """Résultat d'une lecture en cours, attendu par les appels identiques fusionnés."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class ApiScheduler:
+    """
+    Point de passage de tous les appels gspread du processus (sessions, worker de
+    synchro, relances) :
+      - seau à jetons commun à tous les threads : rafale de burst appels, puis
+        remplissage réglé pour ne jamais dépasser quota appels sur window secondes ;
+      - file par priorité : le jeton suivant va à l'appel le plus prioritaire, puis
+        au plus ancien (voir PRIORITY_*) ;
+      - lectures identiques simultanées (même key) fusionnées : un seul appel, même
+        résultat pour tous (à ne pas modifier) ;
+      - erreur 429 : pause globale avec délai exponentiel, puis nouvel essai.
+    La priorité par défaut d'un thread se règle avec priority() (worker de synchro).
+    """
+    def __init__(self, quota=API_QUOTA, window=API_QUOTA_WINDOW, burst=API_BURST, max_wait=API_MAX_WAIT):
+        # Sur toute fenêtre : burst + rate * window <= quota
+        burst = max(min(burst, quota // 2), 1)
+        self.rate, self.burst, self.max_wait = (quota - burst) / window, burst, max_wait
+        self.cond = threading.Condition()
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.quota_errors = 0
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.in_flight = {}
+        self.local = threading.local()
+        self.stats = {'appels': 0, 'fusionnés': 0, '429': 0, 'abandons': 0, 'attente (s)': 0.0}
+
+    @contextmanager
+    def priority(self, level):
+        previous = getattr(self.local, 'priority', None)
+        self.local.priority = level
+        try:
+            yield
+        finally:
+            self.local.priority = previous
+
+    def status(self):
+        with self.cond:
+            return dict(self.stats, **{
+                'attente (s)': round(self.stats['attente (s)'], 1), 'jetons': round(self.tokens, 1), "file d'attente": len(self.waiting),
+                'pause (s)': round(max(self.paused_until - time.monotonic(), 0), 1),
+            })
+
+    def _acquire(self, priority):
+        ticket = (priority, next(self.sequence))
+        start = time.monotonic()
+        with self.cond:
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+                    self.refilled_at = now
+                    if self.waiting[0] == ticket and self.tokens >= 1 and now >= self.paused_until:
+                        heapq.heappop(self.waiting)
+                        self.tokens -= 1
+                        self.stats['appels'] += 1
+                        self.stats['attente (s)'] += now - start
+                        return
+                    if now - start > self.max_wait:
+                        self.stats['abandons'] += 1
+                        raise ApiBusyError(f"Google Sheets saturé : pas de créneau d'appel après {self.max_wait} s")
+                    self.cond.wait(min(max(self.paused_until - now, (1 - self.tokens) / self.rate, 0.01), 1.0))
+            except BaseException:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                raise
+            finally:
+                self.cond.notify_all()
+
+    def _call(self, func, priority):
+        for attempt in range(API_QUOTA_RETRIES + 1):
+            self._acquire(priority)
+            try:
+                result = func()
+            except gspread.exceptions.APIError as e:
+                if e.code != 429 or attempt == API_QUOTA_RETRIES:
+                    raise
+                with self.cond:
+                    # Quota dépassé : plus aucun appel, quelle que soit la session, pendant la pause
+                    self.quota_errors += 1
+                    self.stats['429'] += 1
+                    pause = min(API_QUOTA_BACKOFF * 2 ** (self.quota_errors - 1), 60) + random.uniform(0, 1)
+                    self.paused_until = max(self.paused_until, time.monotonic() + pause)
+                    self.tokens = 0.0
+                continue
+            with self.cond:
+                self.quota_errors = 0
+            return result
+
+    def call(self, func, priority=None, key=None):
+        """Exécute func() quand un jeton est disponible ; key : lecture fusionnable."""
+        if priority is None:
+            priority = getattr(self.local, 'priority', None)
+        if priority is None:
+            priority = PRIORITY_READ
+        if key is None:
+            return self._call(func, priority)
+        with self.cond:
+            shared = self.in_flight.get(key)
+            owner = shared is None
+            if owner:
+                shared = self.in_flight[key] = _SharedCall()
+            else:
+                self.stats['fusionnés'] += 1
+        if not owner:
+            return shared.wait()
+        try:
+            shared.result = self._call(func, priority)
+            return shared.result
+        except BaseException as e:
+            shared.error = e
+            raise
+        finally:
+            with self.cond:
+                self.in_flight.pop(key, None)
+            shared.done.set()
+
+@st.cache_resource(show_spinner=False)
+def get_api_scheduler():
+    return ApiScheduler(get_setting("api_quota", API_QUOTA), burst=get_setting("api_burst", API_BURST))
+
+def api_priority(level):
+    """Priorité par défaut des appels Google Sheets du thread courant (bloc with)."""
+    return get_api_scheduler().priority(level)
+
+# --- CACHE DES ONGLETS (partagé entre sessions) ---
+# Durée de validité par défaut d'un onglet en cache (secrets : [app] data_cache_ttl)
+DATA_CACHE_TTL = 120
+
+class WorksheetCache:
+    """
+    Cache process-wide des onglets lus : {ws_name: (version, horodatage, DataFrame, dérivés)}.
+    Chaque écriture incrémente la version de l'onglet concerné ; un chargement
+    commencé avant une écriture n'est donc jamais stocké. Les dérivés (index de
+    clés...) vivent et meurent avec le DataFrame dont ils sont issus ; les vues
+    partielles (project) vivent avec la version de l'onglet, sans onglet complet.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.versions = {}
+        self.projections = {}
+
+    def version(self, ws_name):
+        with self.lock:
+            return self.versions.get(ws_name, 0)
+
+    def get(self, ws_name, ttl):
+        with self.lock:
+            entry = self.entries.get(ws_name)
+            if entry is None:
+                return None
+            version, loaded_at, df, _ = entry
+            if version != self.versions.get(ws_name, 0) or time.monotonic() - loaded_at > ttl:
+                del self.entries[ws_name]
+                return None
+            return df
+
+    def put(self, ws_name, version, df):
+        with self.lock:
+            if version == self.versions.get(ws_name, 0):
+                self.entries[ws_name] = (version, time.monotonic(), df, {})
+
+    def derive(self, ws_name, df, name, builder):
+        """Valeur calculée une seule fois par version chargée de l'onglet."""
+        with self.lock:
+            entry = self.entries.get(ws_name)
+            derived = entry[3] if entry is not None and entry[2] is df else None
+            if derived is not None and name in derived:
+                return derived[name]
+        value = builder()
+        if derived is not None:
+            with self.lock:
+                derived[name] = value
+        return value
+
+    def project(self, ws_name, name, ttl, builder):
+        """Valeur calculée une seule fois par version de l'onglet (colonnes ou lignes choisies)."""
+        for _ in range(2):
+            with self.lock:
+                version = self.versions.get(ws_name, 0)
+                entry = self.projections.get(ws_name)
+                if entry is not None and entry[0] == version and time.monotonic() - entry[1] <= ttl and name in entry[2]:
+                    return entry[2][name]
+            value = builder()
+            with self.lock:
+                if version == self.versions.get(ws_name, 0):
+                    entry = self.projections.get(ws_name)
+                    if entry is None or entry[0] != version or time.monotonic() - entry[1] > ttl:
+                        entry = self.projections[ws_name] = (version, time.monotonic(), {})
+                    entry[2][name] = value
+                    return value
+            # Première synchro faite pendant le calcul : recalcul pour pouvoir le garder
+        return value
+
+    def invalidate(self, ws_name=None):
+        with self.lock:
+            names = [ws_name] if ws_name else list(set(self.entries) | set(self.versions))
+            for name in names:
+                self.versions[name] = self.versions.get(name, 0) + 1
+                self.entries.pop(name, None)
+                self.projections.pop(name, None)
+
+@st.cache_resource(show_spinner=False)
+def get_worksheet_cache():
+    return WorksheetCache()
+
+def invalidate_data_cache(ws_name=None):
+    """Invalide un onglet (après écriture) ou tous les onglets (bouton Actualiser)."""
+    get_worksheet_cache().invalidate(ws_name)
+
+@traced('frame', size=lambda a, k, r: len(r))
+def _values_to_frame(all_values):
+    """Valeurs brutes d'un onglet (en-tête en 1re ligne) -> DataFrame nettoyé, ordre de la feuille."""
+    if not all_values:
+        return pd.DataFrame()
         
-        # On récupère toutes les valeurs pour filtrer les colonnes vides qui causent l'erreur 'duplicates'
-        all_values = ws.get_all_values()
-        if not all_values:
-            return pd.DataFrame(columns=cols)
-            
-        header = all_values[0]
-        data = all_values[1:]
-        df = pd.DataFrame(data, columns=header)
+    header = all_values[0]
+    data = all_values[1:]
+    df = pd.DataFrame(data, columns=header)
+    
+    # Supprimer les colonnes sans nom (vides) qui font planter AgGrid/Pandas
+    df = df.loc[:, ~df.columns.duplicated()]
+    if '' in df.columns:
+        df = df.drop(columns=[''])
         
-        # Supprimer les colonnes sans nom (vides) qui font planter AgGrid/Pandas
-        df = df.loc[:, ~df.columns.duplicated()]
-        if '' in df.columns:
-            df = df.drop(columns=[''])
-            
-        # Nettoyage des noms de colonnes
-        df.columns = [c.strip() for c in df.columns]
+    # Nettoyage des noms de colonnes
+    df.columns = [c.strip() for c in df.columns]
+    df = df.fillna('')
+    
+    # Position (0-based) de chaque colonne conservée dans la feuille, pour les écritures ciblées
+    df.attrs['positions'] = _header_positions(header)
+    return df
+
+def _header_positions(header):
+    """En-tête brut -> {colonne: position 0-based}, première occurrence de chaque nom."""
+    positions = {}
+    for i, name in enumerate(header):
+        if name and name.strip() not in positions:
+            positions[name.strip()] = i
+    return positions
+
+def _fetch_worksheet_frame(ws_name):
+    """Télécharge un onglet complet et nettoie les en-têtes (ordre de la feuille)."""
+    # On récupère toutes les valeurs pour filtrer les colonnes vides qui causent l'erreur 'duplicates'
+    return _values_to_frame(run_on_worksheet(ws_name, lambda ws: ws.get_all_values()))
+
+# --- COPIE LOCALE DU CLASSEUR (SQLite) ---
+MIRROR_PATH = os.path.join(LOCAL_STORE_DIR, 'mirror.sqlite')
+MIRRORED_SHEETS = [WS_DATA, WS_REFUS, WS_TRANSPORT, WS_PDC, WS_MAILS]
+MIRROR_SYNC_INTERVAL = 15      # secondes entre deux passages du worker de synchronisation
+MIRROR_FULL_SYNC_INTERVAL = 600  # relecture complète (modifications faites dans Google Sheets)
+MIRROR_MAX_FULL_SYNC_AGE = 3600  # relecture complète même si le classeur semble inchangé
+WRITE_FLUSH_INTERVAL = 3       # secondes entre deux envois de la file d'écriture
+WRITE_RETRY_BASE = 5           # délai avant nouvel essai après un échec, doublé à chaque échec
+WRITE_RETRY_MAX = 300
+WRITE_MAX_ATTEMPTS = 10        # échecs passagers avant de mettre l'écriture de côté (failed_writes)
+
+def _is_transient_error(e):
+    """Indisponibilité passagère de Google Sheets (quota, erreur serveur, réseau)."""
+    if isinstance(e, gspread.exceptions.APIError):
+        return e.code == 429 or e.code >= 500
+    return isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, ConnectionError, TimeoutError))
+
+def _parse_a1_start(a1_range):
+    """'K4:L4' ou 'K4' -> (4, 11) : cellule de départ (1-based)."""
+    return gspread.utils.a1_to_rowcol(a1_range.split('!')[-1].split(':')[0])
+
+class LocalMirror:
+    """
+    Copie SQLite des onglets (valeurs brutes, en-tête en ligne 1) servant toutes
+    les lectures. La table pending_writes sert de journal d'écriture durable.
+    Le worker de synchronisation (voir start) :
+      - vide la file d'écriture toutes les WRITE_FLUSH_INTERVAL secondes ;
+      - demande à l'API Drive la date de modification du classeur (un seul appel,
+        voir probe) et ne lit aucun onglet si elle n'a pas changé ;
+      - lit uniquement les lignes ajoutées depuis la dernière synchro ;
+      - relit l'onglet complet toutes les MIRROR_FULL_SYNC_INTERVAL secondes, si le
+        classeur a changé depuis la dernière relecture complète de cet onglet.
+    on_change(ws_name) est appelé quand le contenu local d'un onglet change.
+    Les écouteurs de lignes (add_row_listener) reçoivent en plus le détail, sous le
+    verrou : listener(ws_name, première ligne, lignes, full), full=True pour un
+    remplacement complet (en-tête compris).
+    """
+    def __init__(self, path=MIRROR_PATH, sheets=MIRRORED_SHEETS, on_change=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.sheets = list(sheets)
+        self.on_change = on_change or (lambda ws_name: None)
+        self.row_listeners = []
+        self.lock = threading.RLock()
+        self.stale = set()
+        self.last_error = {}
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS sheets (ws_name TEXT PRIMARY KEY, n_rows INTEGER, synced_at REAL, full_synced_at REAL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS rows (ws_name TEXT, row_num INTEGER, data TEXT, PRIMARY KEY (ws_name, row_num))")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS pending_writes (id INTEGER PRIMARY KEY AUTOINCREMENT, ws_name TEXT, kind TEXT, "
+                "payload TEXT, created_at REAL, attempts INTEGER DEFAULT 0, last_error TEXT DEFAULT '', "
+                "next_try REAL DEFAULT 0, first_row INTEGER)"
+            )
+            # Écritures abandonnées (erreur définitive ou trop d'échecs), consultables sur la page de diagnostic
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS failed_writes (id INTEGER PRIMARY KEY, ws_name TEXT, kind TEXT, "
+                "payload TEXT, created_at REAL, attempts INTEGER, last_error TEXT, failed_at REAL)"
+            )
+            self.db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+            # Date de modification du classeur vue lors de la dernière lecture (fin / complète) de chaque onglet
+            self.db.execute("CREATE TABLE IF NOT EXISTS probes (ws_name TEXT PRIMARY KEY, modified TEXT, full_modified TEXT)")
+            # Journaux créés par une version antérieure
+            columns = [r[1] for r in self.db.execute("PRAGMA table_info(pending_writes)")]
+            if 'next_try' not in columns:
+                self.db.execute("ALTER TABLE pending_writes ADD COLUMN next_try REAL DEFAULT 0")
+            if 'first_row' not in columns:
+                self.db.execute("ALTER TABLE pending_writes ADD COLUMN first_row INTEGER")
+
+    def add_row_listener(self, listener):
+        self.row_listeners.append(listener)
+
+    def _notify_rows(self, ws_name, start, rows, full):
+        for listener in self.row_listeners:
+            listener(ws_name, start, rows, full)
+
+    # -- lecture locale --
+    def _meta(self, ws_name):
+        row = self.db.execute("SELECT n_rows, synced_at, full_synced_at FROM sheets WHERE ws_name = ?", (ws_name,)).fetchone()
+        return row or (0, None, None)
+
+    def _ensure_synced(self, ws_name):
+        """Première lecture ou onglet marqué périmé => synchro immédiate."""
+        with self.lock:
+            _, synced_at, _ = self._meta(ws_name)
+        if synced_at is None or ws_name in self.stale:
+            self.pull(ws_name, full=True)
+
+    def values(self, ws_name):
+        """Valeurs brutes de l'onglet (en-tête compris)."""
+        self._ensure_synced(ws_name)
+        with self.lock:
+            rows = self.db.execute("SELECT data FROM rows WHERE ws_name = ? ORDER BY row_num", (ws_name,)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def frame(self, ws_name):
+        return _values_to_frame(self.values(ws_name))
+
+    def rows_at(self, ws_name, row_nums):
+        """{numéro de ligne: valeurs brutes} pour les lignes demandées."""
+        row_nums = [int(r) for r in row_nums]
+        with self.lock:
+            found = self.db.execute(
+                f"SELECT row_num, data FROM rows WHERE ws_name = ? AND row_num IN ({', '.join('?' * len(row_nums))})",
+                [ws_name] + row_nums
+            ).fetchall()
+        return {r: json.loads(data) for r, data in found}
+
+    def header(self, ws_name):
+        """En-tête brut de l'onglet (ligne 1)."""
+        self._ensure_synced(ws_name)
+        with self.lock:
+            row = self.db.execute("SELECT data FROM rows WHERE ws_name = ? AND row_num = 1", (ws_name,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def project(self, ws_name, positions, where=(), limit=None):
+        """
+        Lignes de données réduites aux colonnes positions (0-based), les plus
+        récentes en premier : [(row_num, valeur, ...)]. where = [(position, valeurs
+        acceptées)] est évalué par SQLite : les lignes écartées ne sont pas décodées.
+        """
+        self._ensure_synced(ws_name)
+        select = "".join(f", COALESCE(json_extract(data, '$[{int(p)}]'), '')" for p in positions)
+        sql = f"SELECT row_num{select} FROM rows WHERE ws_name = ? AND row_num > 1"
+        params = [ws_name]
+        for position, accepted in where:
+            sql += f" AND COALESCE(json_extract(data, '$[{int(position)}]'), '') IN ({', '.join('?' * len(accepted))})"
+            params.extend(accepted)
+        sql += " ORDER BY row_num DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self.lock:
+            return self.db.execute(sql, params).fetchall()
+
+    def last_sync(self):
+        """Horodatage (epoch) de la synchro la plus ancienne parmi les onglets déjà copiés."""
+        with self.lock:
+            row = self.db.execute("SELECT MIN(synced_at) FROM sheets").fetchone()
+        return row[0]
+
+    def mark_stale(self, ws_name=None):
+        """Force une relecture complète à la prochaine lecture (bouton Actualiser)."""
+        self.stale.update([ws_name] if ws_name else self.sheets)
+
+    # -- écriture locale --
+    def _store(self, ws_name, values, full):
+        with self.lock, self.db:
+            now = time.time()
+            if full:
+                self.db.execute("DELETE FROM rows WHERE ws_name = ?", (ws_name,))
+                start = 1
+            else:
+                start = self._meta(ws_name)[0] + 1
+            self.db.executemany(
+                "INSERT OR REPLACE INTO rows (ws_name, row_num, data) VALUES (?, ?, ?)",
+                [(ws_name, start + i, json.dumps(row, ensure_ascii=False)) for i, row in enumerate(values)]
+            )
+            n_rows = start - 1 + len(values)
+            full_at = now if full else self._meta(ws_name)[2]
+            self.db.execute(
+                "INSERT OR REPLACE INTO sheets (ws_name, n_rows, synced_at, full_synced_at) VALUES (?, ?, ?, ?)",
+                (ws_name, n_rows, now, full_at)
+            )
+            if full or values:
+                self._notify_rows(ws_name, start, values, full)
+
+    def apply_updates(self, ws_name, updates):
+        """Reporte localement des mises à jour au format batch_update."""
+        with self.lock, self.db:
+            changed = {}
+            for update in updates:
+                row0, col0 = _parse_a1_start(update['range'])
+                for r_off, values in enumerate(update['values']):
+                    found = self.db.execute(
+                        "SELECT data FROM rows WHERE ws_name = ? AND row_num = ?", (ws_name, row0 + r_off)
+                    ).fetchone()
+                    row = json.loads(found[0]) if found else []
+                    for c_off, value in enumerate(values):
+                        col = col0 - 1 + c_off
+                        row.extend([''] * (col + 1 - len(row)))
+                        row[col] = str(value)
+                    changed[row0 + r_off] = row
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO rows (ws_name, row_num, data) VALUES (?, ?, ?)",
+                        (ws_name, row0 + r_off, json.dumps(row, ensure_ascii=False))
+                    )
+                    self.db.execute(
+                        "UPDATE sheets SET n_rows = MAX(n_rows, ?) WHERE ws_name = ?", (row0 + r_off, ws_name)
+                    )
+            for row_num in sorted(changed):
+                self._notify_rows(ws_name, row_num, [changed[row_num]], False)
+        self.on_change(ws_name)
+
+    def append_local(self, ws_name, rows):
+        """Ajoute des lignes en fin de copie locale (position provisoire jusqu'à la relecture complète)."""
+        with self.lock:
+            self._store(ws_name, [[str(v) for v in row] for row in rows], full=False)
+        self.on_change(ws_name)
+
+    # -- écritures en attente --
+    def enqueue(self, ws_name, kind, payload):
+        """Met une écriture en attente ('update' : batch_update, 'append' : append_rows) et l'applique localement."""
+        with self.lock:
+            synced = self._meta(ws_name)[1] is not None
+        if not synced:
+            # Copie locale à initialiser avant d'y placer des lignes provisoires
+            try:
+                self.pull(ws_name, full=True)
+            except Exception:
+                pass
+        with self.lock:
+            first_row = self._meta(ws_name)[0] + 1 if kind == 'append' else None
+            with self.db:
+                self.db.execute(
+                    "INSERT INTO pending_writes (ws_name, kind, payload, created_at, first_row) VALUES (?, ?, ?, ?, ?)",
+                    (ws_name, kind, json.dumps(payload, ensure_ascii=False, default=str), time.time(), first_row)
+                )
+            if kind == 'update':
+                self.apply_updates(ws_name, payload)
+            else:
+                self.append_local(ws_name, payload)
+
+    def pending_count(self, ws_name=None):
+        with self.lock:
+            if ws_name:
+                return self.db.execute("SELECT COUNT(*) FROM pending_writes WHERE ws_name = ?", (ws_name,)).fetchone()[0]
+            return self.db.execute("SELECT COUNT(*) FROM pending_writes").fetchone()[0]
+
+    def _set_aside(self, batch, attempts, error):
+        ids = [(entry[0],) for entry in batch]
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO failed_writes (id, ws_name, kind, payload, created_at, attempts, last_error, failed_at) "
+                "SELECT id, ws_name, kind, payload, created_at, ?, ?, ? FROM pending_writes WHERE id = ?",
+                [(attempts, error, time.time(), entry_id) for (entry_id,) in ids]
+            )
+            self.db.executemany("DELETE FROM pending_writes WHERE id = ?", ids)
+
+    def failed_writes(self):
+        """Écritures mises de côté, plus récentes en premier : DataFrame sans le contenu envoyé."""
+        with self.lock:
+            return pd.read_sql_query(
+                "SELECT id, ws_name AS onglet, kind AS type, attempts AS tentatives, last_error AS erreur, "
+                "datetime(failed_at, 'unixepoch', 'localtime') AS abandon FROM failed_writes ORDER BY id DESC", self.db
+            )
+
+    def failed_count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM failed_writes").fetchone()[0]
+
+    def retry_failed(self, ids):
+        """Remet des écritures mises de côté dans la file (à la fin, dans leur ordre d'origine, essais remis à zéro)."""
+        with self.lock, self.db:
+            for entry_id in sorted(ids):
+                self.db.execute(
+                    "INSERT INTO pending_writes (ws_name, kind, payload, created_at) "
+                    "SELECT ws_name, kind, payload, created_at FROM failed_writes WHERE id = ?", (entry_id,)
+                )
+                self.db.execute("DELETE FROM failed_writes WHERE id = ?", (entry_id,))
+
+    def discard_failed(self, ids):
+        with self.lock, self.db:
+            self.db.executemany("DELETE FROM failed_writes WHERE id = ?", [(entry_id,) for entry_id in ids])
+
+    def push_pending(self):
+        """
+        Envoie les écritures en attente, onglet par onglet et dans l'ordre. Les ajouts
+        consécutifs d'un même onglet partent en un seul append_rows. Après un échec
+        passager, l'onglet est mis en pause WRITE_RETRY_BASE * 2^(tentatives - 1) secondes.
+        Une erreur définitive (onglet supprimé, requête refusée) ou WRITE_MAX_ATTEMPTS
+        échecs mettent l'écriture de côté (failed_writes) : elle ne bloque plus la file
+        ni la synchro de l'onglet, dont la copie locale est relue entièrement.
+        """
+        with self.lock:
+            pending = self.db.execute(
+                "SELECT id, ws_name, kind, payload, first_row, attempts, next_try FROM pending_writes ORDER BY id"
+            ).fetchall()
+        by_sheet = OrderedDict()
+        for entry in pending:
+            by_sheet.setdefault(entry[1], []).append(entry)
         
-        # S'assurer que toutes les colonnes attendues sont présentes
-        for col in cols:
-            if col not in df.columns:
-                df[col] = ""
-                
-        return df[cols].fillna('').iloc[::-1]
+        now = time.time()
+        for ws_name, entries in by_sheet.items():
+            if entries[0][6] > now:
+                continue
+            i = 0
+            while i < len(entries):
+                batch = [entries[i]]
+                if entries[i][2] == 'append':
+                    while i + len(batch) < len(entries) and entries[i + len(batch)][2] == 'append':
+                        batch.append(entries[i + len(batch)])
+                try:
+                    if batch[0][2] == 'update':
+                        data = json.loads(batch[0][3])
+                        run_on_worksheet(ws_name, lambda ws: ws.batch_update(data), priority=PRIORITY_WRITE)
+                    else:
+                        data = [row for entry in batch for row in json.loads(entry[3])]
+                        response = run_on_worksheet(ws_name, lambda ws: ws.append_rows(data, table_range='A1'), priority=PRIORITY_WRITE)
+                except Exception as e:
+                    attempts = batch[0][5] + 1
+                    if _is_transient_error(e) and attempts < WRITE_MAX_ATTEMPTS:
+                        delay = min(WRITE_RETRY_MAX, WRITE_RETRY_BASE * 2 ** (attempts - 1))
+                        with self.lock, self.db:
+                            self.db.execute(
+                                "UPDATE pending_writes SET attempts = ?, last_error = ?, next_try = ? WHERE id = ?",
+                                (attempts, str(e), time.time() + delay, batch[0][0])
+                            )
+                        break
+                    self._set_aside(batch, attempts, str(e))
+                    self.stale.add(ws_name)
+                    i += len(batch)
+                    continue
+                with self.lock, self.db:
+                    self.db.executemany("DELETE FROM pending_writes WHERE id = ?", [(entry[0],) for entry in batch])
+                if batch[0][2] == 'append':
+                    # Lignes insérées ailleurs qu'à la position provisoire : relecture complète
+                    try:
+                        written_at = _parse_a1_start(response['updates']['updatedRange'])[0]
+                    except Exception:
+                        written_at = None
+                    if written_at != batch[0][4]:
+                        self.stale.add(ws_name)
+                i += len(batch)
+
+    # -- compteurs --
+    def next_counter(self, name, floor=0):
+        """
+        Réserve la valeur suivante du compteur (au moins floor + 1). La transaction
+        BEGIN IMMEDIATE verrouille le fichier : deux sessions ou deux processus ne
+        peuvent jamais obtenir la même valeur.
+        """
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+                value = max(row[0] if row else 0, int(floor)) + 1
+                self.db.execute("INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)", (name, value))
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+            return value
+
+    def peek_counter(self, name, floor=0):
+        """Valeur que donnerait next_counter, sans la réserver (affichage)."""
+        return max(self.counter_value(name) or 0, int(floor)) + 1
+
+    def counter_value(self, name):
+        """Dernière valeur réservée du compteur, None s'il n'a jamais servi."""
+        with self.lock:
+            row = self.db.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    # -- synchronisation --
+    def probe(self):
+        """Date de dernière modification du classeur (API Drive), None si indisponible."""
+        try:
+            modified = run_on_worksheet(None, lambda spreadsheet: spreadsheet.get_lastUpdateTime(), key=('probe',))
+        except Exception as e:
+            self.last_error['probe'] = str(e)
+            return None
+        self.last_error.pop('probe', None)
+        return modified
+
+    def _probe_state(self, ws_name):
+        row = self.db.execute("SELECT modified, full_modified FROM probes WHERE ws_name = ?", (ws_name,)).fetchone()
+        return row or (None, None)
+
+    def pull(self, ws_name, full=False, modified=None):
+        """
+        Met à jour la copie locale depuis Google Sheets. Hors relecture complète,
+        seules les lignes situées après la dernière ligne connue sont lues.
+        modified (voir probe) : si le classeur n'a pas changé depuis la dernière
+        lecture de l'onglet, rien n'est téléchargé.
+        Retourne True si le contenu local a changé.
+        """
+        with self.lock:
+            n_rows, synced_at, full_synced_at = self._meta(ws_name)
+            seen, full_seen = self._probe_state(ws_name)
+        if self.pending_count(ws_name):
+            return False
+        forced = (full or synced_at is None or ws_name in self.stale
+                  or time.time() - (full_synced_at or 0) > MIRROR_MAX_FULL_SYNC_AGE)
+        full = forced or time.time() - (full_synced_at or 0) > MIRROR_FULL_SYNC_INTERVAL
+        if not forced and modified is not None and modified == (full_seen if full else seen):
+            # Classeur inchangé : la copie locale est à jour
+            with self.lock, self.db:
+                self.db.execute("UPDATE sheets SET synced_at = ? WHERE ws_name = ?", (time.time(), ws_name))
+            return False
+        if full:
+            values = run_on_worksheet(ws_name, lambda ws: ws.get_all_values(), key=('values', ws_name))
+            self.stale.discard(ws_name)
+            with self.lock:
+                before = self.db.execute("SELECT data FROM rows WHERE ws_name = ? ORDER BY row_num", (ws_name,)).fetchall()
+                changed = [json.loads(r[0]) for r in before] != values
+                self._store(ws_name, values, full=True)
+        else:
+            values = run_on_worksheet(ws_name, lambda ws: self._fetch_tail(ws, n_rows), key=('tail', ws_name, n_rows))
+            changed = bool(values)
+            with self.lock:
+                self._store(ws_name, values, full=False)
+        if modified is not None:
+            # Date lue avant le téléchargement : une écriture concurrente sera relue au passage suivant
+            with self.lock, self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO probes (ws_name, modified, full_modified) VALUES (?, ?, ?)",
+                    (ws_name, modified, modified if full else full_seen)
+                )
+        self.last_error.pop(ws_name, None)
+        if changed:
+            self.on_change(ws_name)
+        return changed
+
+    @staticmethod
+    def _fetch_tail(ws, n_rows):
+        """Lignes situées après la ligne n_rows (vide si aucune)."""
+        try:
+            last_col = re.sub(r'\d', '', gspread.utils.rowcol_to_a1(1, ws.col_count))
+            values = ws.get(f"A{n_rows + 1}:{last_col}")
+        except gspread.exceptions.APIError as e:
+            if e.code == 400:  # plage au-delà de la grille : aucune nouvelle ligne
+                return []
+            raise
+        width = max((len(r) for r in values), default=0)
+        return [list(r) + [''] * (width - len(r)) for r in values]
+
+    def sync_once(self):
+        self.push_pending()
+        modified = self.probe()
+        for ws_name in self.sheets:
+            try:
+                self.pull(ws_name, modified=modified)
+            except Exception as e:
+                self.last_error[ws_name] = str(e)
+
+    def start(self, flush_interval=WRITE_FLUSH_INTERVAL, sync_interval=MIRROR_SYNC_INTERVAL):
+        def _loop():
+            last_sync = time.monotonic()
+            # Lectures de synchro après celles des pages ; les écritures en file gardent leur priorité
+            with api_priority(PRIORITY_BACKGROUND):
+                while True:
+                    time.sleep(flush_interval)
+                    try:
+                        self.push_pending()
+                    except Exception as e:
+                        self.last_error['push'] = str(e)
+                    if time.monotonic() - last_sync >= sync_interval:
+                        self.sync_once()
+                        last_sync = time.monotonic()
+        threading.Thread(target=_loop, name='mirror-sync', daemon=True).start()
+        return self
+
+@st.cache_resource(show_spinner=False)
+def get_mirror():
+    cache = get_worksheet_cache()
+    return LocalMirror(on_change=cache.invalidate).start()
+
+def _after_write(ws_name, updates=None, appended_rows=None):
+    """Reporte une écriture réussie sur la copie locale puis invalide le cache mémoire."""
+    mirror = get_mirror()
+    if updates:
+        mirror.apply_updates(ws_name, updates)
+    if appended_rows:
+        # Relecture des seules lignes ajoutées (position réelle donnée par Sheets)
+        try:
+            mirror.pull(ws_name)
+        except Exception:
+            mirror.mark_stale(ws_name)
+    invalidate_data_cache(ws_name)
+
+def _get_worksheet_frame(ws_name):
+    """Onglet complet dans l'ordre de la feuille, servi depuis le cache puis la copie locale."""
+    cache = get_worksheet_cache()
+    df = cache.get(ws_name, get_setting("data_cache_ttl", DATA_CACHE_TTL))
+    if df is None:
+        version = cache.version(ws_name)
+        df = get_mirror().frame(ws_name)
+        if cache.version(ws_name) != version:
+            # Première synchro faite pendant la lecture : relecture pour pouvoir mettre en cache
+            version = cache.version(ws_name)
+            df = get_mirror().frame(ws_name)
+        cache.put(ws_name, version, df)
+    return df
+
+def get_header_map(ws_name):
+    """Position (0-based) de chaque colonne de l'onglet, lue une fois par version dans la copie locale."""
+    return get_worksheet_cache().project(
+        ws_name, ('header',), get_setting("data_cache_ttl", DATA_CACHE_TTL),
+        lambda: _header_positions(get_mirror().header(ws_name))
+    )
+
+def _where_key(where):
+    """{colonne: valeur ou liste de valeurs} -> tuple trié, utilisable comme clé de cache."""
+    return tuple(sorted(
+        (col, (str(accepted),) if isinstance(accepted, str) or not hasattr(accepted, '__iter__') else tuple(map(str, accepted)))
+        for col, accepted in (where or {}).items()
+    ))
+
+def _project_frame(df, cols, where=(), limit=None):
+    """Colonnes cols et lignes retenues par where d'un onglet complet, plus récentes en premier."""
+    for col, accepted in where:
+        column = df[col] if col in df.columns else pd.Series('', index=df.index)
+        df = df[column.isin(accepted).to_numpy()]
+    view = df.reindex(columns=cols, fill_value='').iloc[::-1]
+    if limit is not None:
+        view = view.head(limit)
+    return view.copy()
+
+def _project_store(ws_name, cols, where=(), limit=None):
+    """
+    Même résultat que _project_frame, lu dans la copie locale : seules les colonnes
+    demandées sont extraites et le filtre where est appliqué par SQLite. Les labels
+    de lignes sont ceux de l'onglet complet (position dans la feuille).
+    """
+    positions = get_header_map(ws_name)
+    conditions = []
+    for col, accepted in where:
+        if col in positions:
+            conditions.append((positions[col], accepted))
+        elif '' not in accepted:
+            # Colonne absente de la feuille : toujours vide
+            return pd.DataFrame(columns=cols)
+    wanted = list(dict.fromkeys(c for c in cols if c in positions))
+    rows = get_mirror().project(ws_name, [positions[c] for c in wanted], conditions, limit)
+    columns = list(zip(*rows)) or [()] * (len(wanted) + 1)
+    df = pd.DataFrame(dict(zip(wanted, columns[1:])), index=pd.Index(columns[0], dtype='int64') - 2)
+    return df.reindex(columns=cols, fill_value='')
+
+def _load_view(ws_name, cols, typed=False, where=(), limit=None):
+    """
+    Vue partagée (à ne pas modifier) d'un onglet, calculée une fois par version :
+    depuis l'onglet complet s'il est en mémoire ou si la vue en prend l'essentiel,
+    sinon depuis la copie locale (colonnes et lignes choisies par SQLite).
+    """
+    cache = get_worksheet_cache()
+    ttl = get_setting("data_cache_ttl", DATA_CACHE_TTL)
+    def _build():
+        full = cache.get(ws_name, ttl)
+        if full is None and not where and limit is None and 2 * len(cols) >= len(get_header_map(ws_name)):
+            # Vue large sans filtre : décoder les lignes entières coûte moins que json_extract par colonne
+            full = _get_worksheet_frame(ws_name)
+        if full is not None:
+            view = _project_frame(full, cols, where, limit)
+        else:
+            view = _project_store(ws_name, cols, where, limit)
+        return apply_schema(view) if typed else view
+    return cache.project(ws_name, ('view', tuple(cols), typed, where, limit), ttl, _build)
+
+def get_key_index(ws_name, key_col):
+    """Ensemble des clés (texte) d'un onglet, lu dans la seule colonne key_col une fois par version."""
+    def _build():
+        if key_col not in get_header_map(ws_name):
+            return frozenset()
+        return frozenset(_load_view(ws_name, [key_col])[key_col].astype(str))
+    return get_worksheet_cache().project(ws_name, ('keys', key_col), get_setting("data_cache_ttl", DATA_CACHE_TTL), _build)
+
+def get_max_id(ws_name, id_col):
+    """Plus grand identifiant numérique d'un onglet (0 si aucun), calculé une fois par version."""
+    def _build():
+        if id_col not in get_header_map(ws_name):
+            return 0
+        ids = pd.to_numeric(_load_view(ws_name, [id_col])[id_col], errors='coerce')
+        return int(ids.max()) if ids.notna().any() else 0
+    return get_worksheet_cache().project(ws_name, ('max', id_col), get_setting("data_cache_ttl", DATA_CACHE_TTL), _build)
+
+def peek_transport_id():
+    """Numéro indicatif du prochain transport ; compteur local seul si l'onglet est illisible."""
+    try:
+        floor = get_max_id(WS_TRANSPORT, 'NumTransport')
+    except Exception as e:
+        st.warning(f"⚠️ Lecture de l'onglet {WS_TRANSPORT} impossible, numéro indicatif : {e}")
+        floor = 0
+    return get_mirror().peek_counter('NumTransport', floor)
+
+def allocate_transport_id():
+    """
+    NumTransport unique : compteur verrouillé, recalé à chaque fois sur le plus grand numéro
+    de l'onglet (lu en cache, lignes ajoutées dans Sheets ou par une autre instance comprises).
+    Onglet illisible : compteur local seul s'il existe, sinon None (avec message), car
+    repartir de 0 donnerait des numéros déjà utilisés.
+    """
+    mirror = get_mirror()
+    try:
+        floor = get_max_id(WS_TRANSPORT, 'NumTransport')
+    except Exception as e:
+        if mirror.counter_value('NumTransport') is None:
+            st.error(f"❌ Numéro de transport indisponible (onglet {WS_TRANSPORT} illisible) : {e}")
+            return None
+        st.warning(f"⚠️ Onglet {WS_TRANSPORT} illisible, numéro attribué par le compteur local : {e}")
+        floor = 0
+    return mirror.next_counter('NumTransport', floor)
+
+def _build_row_index(df, key_col):
+    """Série clé (texte) -> label de ligne du DataFrame, première occurrence conservée."""
+    row_index = pd.Series(df.index, index=df[key_col].astype(str).values)
+    return row_index[~row_index.index.duplicated()]
+
+def get_row_index(ws_name, key_col):
+    """
+    Label de ligne de chaque clé de l'onglet, maintenu avec le cache. Les labels
+    sont ceux des DataFrames renvoyés par load_data (position dans la feuille).
+    """
+    def _build():
+        if key_col not in get_header_map(ws_name):
+            return pd.Series(dtype='int64')
+        # Ordre de la feuille : la première occurrence d'une clé est conservée
+        return _build_row_index(_load_view(ws_name, [key_col]).iloc[::-1], key_col)
+    return get_worksheet_cache().project(ws_name, ('rows', key_col), get_setting("data_cache_ttl", DATA_CACHE_TTL), _build)
+
+# --- SCHÉMA TYPÉ DES ONGLETS ---
+# Type des colonnes dans les DataFrames typés (load_data(..., typed=True)) ;
+# les colonnes absentes de ce dictionnaire restent en texte.
+COLUMN_TYPES = {
+    # Valeurs très répétées : catégories (un code entier par ligne)
+    'Magasin': 'category', 'Fournisseur': 'category', 'StatutBL': 'category',
+    'Collection': 'category', 'Emplacement': 'category', 'NomDeballage': 'category',
+    'LitigesCompta': 'category', 'MAGASIN': 'category', 'Nom du fournisseur': 'category',
+    'NomTransporteur': 'category', 'Acheteur': 'category',
+    # Nombres (NaN si vide ou illisible)
+    'Mt TTC': 'number', 'Qté': 'number', 'NbPalettes': 'number', 'Poids_total': 'number',
+    # Dates (NaT si vide ou illisible)
+    'Livré le': 'date', 'Date du refus': 'date',
+}
+
+def _to_date(series):
+    """Dates texte (ISO ou jj/mm/aaaa) -> datetime64 ; chaque valeur distincte n'est lue qu'une fois."""
+    codes, uniques = pd.factorize(series)
+    days = pd.to_datetime(pd.Series([_parse_day(str(u)) or None for u in uniques], dtype=object), format='%Y-%m-%d')
+    # Code -1 (valeur manquante) -> dernier élément : NaT
+    values = np.append(days.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))[codes]
+    return pd.Series(values, index=series.index, name=series.name)
+
+def apply_schema(df, types=COLUMN_TYPES):
+    """Frame texte -> frame typé selon types (catégories, nombres, dates)."""
+    converters = {'category': lambda s: s.astype('category'), 'number': _to_number, 'date': _to_date}
+    typed = pd.DataFrame({
+        col: converters[types[col]](df[col]) if col in types else df[col]
+        for col in df.columns
+    }, index=df.index)
+    typed.attrs = dict(df.attrs)
+    return typed
+
+def display_frame(df):
+    """Dates et nombres d'un frame typé remis en texte lisible pour AgGrid (vide si manquant)."""
+    out = df.copy(deep=False)
+    for col, dtype in df.dtypes.items():
+        if dtype.kind == 'M':
+            out[col] = df[col].dt.strftime('%Y-%m-%d').fillna('')
+        elif dtype.kind == 'f':
+            out[col] = _number_to_text(df[col])
+    return out
+
+def frame_memory_report(sheets):
+    """Mémoire (Mo) de la vue texte et de la vue typée de chaque onglet {nom: colonnes}."""
+    report = []
+    for ws_name, cols in sheets.items():
+        text = load_data(ws_name, cols)
+        typed = load_data(ws_name, cols, typed=True)
+        before = text.memory_usage(deep=True).sum() / 1e6
+        after = typed.memory_usage(deep=True).sum() / 1e6
+        report.append({
+            'Onglet': ws_name, 'Lignes': len(text),
+            'Texte (Mo)': round(before, 2), 'Typé (Mo)': round(after, 2),
+            'Gain': f"{(1 - after / before) * 100:.0f} %" if before else "-",
+        })
+    return pd.DataFrame(report)
+
+@traced(target=lambda ws_name, *a, **k: ws_name, size=lambda a, k, r: len(r))
+def load_data(ws_name, cols, typed=False, where=None, limit=None):
+    """
+    Charge un onglet (colonnes cols, plus récentes en premier). La vue est calculée
+    une fois par version de l'onglet et partagée entre sessions ; chaque appel en
+    reçoit une copie paresseuse (copy-on-write), sans dupliquer les données.
+    typed=True applique COLUMN_TYPES (catégories, nombres, dates).
+    where={colonne: valeur ou liste de valeurs} ne garde que les lignes correspondantes
+    et limit les n plus récentes ; seules ces colonnes et ces lignes sont lues dans
+    la copie locale, l'onglet complet n'est pas chargé.
+    """
+    try:
+        if not authenticate_gsheet(): return pd.DataFrame(columns=cols)
+        # Les colonnes absentes de la feuille sont ajoutées vides
+        return _load_view(ws_name, cols, typed, _where_key(where), limit).copy(deep=False)
     except Exception as e:
-        # Fallback si get_all_records échoue à cause des doublons
+        # Onglet jamais synchronisé et Google Sheets injoignable (ou saturé)
+        st.warning(f"⚠️ Lecture de l'onglet {ws_name} impossible : {e}")
         return pd.DataFrame(columns=cols)
 
 
-def save_data_to_gsheet(ws_name, df):
-    """Sauvegarde un DataFrame complet dans une feuille de calcul."""
+# --- INDICATEURS DU TABLEAU DE BORD ---
+# Statuts regroupés sous « Terminées »
+DONE_STATUSES = ['TERMINEE', 'Clôturé']
+# Tranches d'ancienneté des réceptions « À déballer » (jours depuis la livraison)
+AGEING_BUCKETS = [(0, 2, "0-2 j"), (3, 7, "3-7 j"), (8, 14, "8-14 j"), (15, None, "15 j et +")]
+
+def _parse_day(text):
+    """'2026-01-05', '2026-01-05 00:00:00' ou '05/01/2026' -> '2026-01-05' ; '' si illisible."""
+    text = text.strip()
+    for fmt, size in (('%Y-%m-%d', 10), ('%d/%m/%Y', 10), ('%d/%m/%y', 8)):
+        try:
+            return datetime.strptime(text[:size], fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return ''
+
+class DashboardAggregates:
+    """
+    Nombre de réceptions de l'onglet DATA par (StatutBL, Magasin, jour de livraison).
+    Tenu à jour ligne par ligne par les notifications de la copie locale (imports,
+    sauvegardes, synchro) : chaque ligne modifiée retire son ancienne clé et ajoute
+    la nouvelle. Le tableau de bord ne lit plus qu'une table de quelques centaines
+    de lignes, quelle que soit la taille de l'historique.
+    """
+    def __init__(self, ws_name=WS_DATA):
+        self.ws_name = ws_name
+        self.lock = threading.Lock()
+        self.ready = False
+        self.positions = {}
+        self.row_keys = {}   # numéro de ligne -> clé comptée
+        self.counts = {}     # clé -> nombre de lignes
+        self._days = {}      # mémo texte -> jour normalisé
+
+    def _key(self, row):
+        def cell(col):
+            i = self.positions.get(col)
+            return str(row[i]).strip() if i is not None and i < len(row) else ''
+        raw_day = cell('Livré le')
+        day = self._days.get(raw_day)
+        if day is None:
+            day = self._days[raw_day] = _parse_day(raw_day)
+        return (cell('StatutBL'), cell('Magasin'), day)
+
+    def _set_row(self, row_num, row):
+        old = self.row_keys.get(row_num)
+        if old is not None:
+            self.counts[old] -= 1
+            if not self.counts[old]:
+                del self.counts[old]
+        if not any(str(v).strip() for v in row):
+            self.row_keys.pop(row_num, None)
+            return
+        key = self._key(row)
+        self.row_keys[row_num] = key
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def reset(self, values):
+        """Recalcul complet à partir des valeurs brutes (en-tête en première ligne)."""
+        with self.lock:
+            self.positions = {str(c).strip(): i for i, c in enumerate(values[0])} if values else {}
+            self.row_keys, self.counts = {}, {}
+            for row_num, row in enumerate(values[1:], start=2):
+                self._set_row(row_num, row)
+            self.ready = True
+
+    def on_rows(self, ws_name, start, rows, full):
+        """Écouteur de LocalMirror : report des lignes ajoutées ou modifiées."""
+        if ws_name != self.ws_name:
+            return
+        if full:
+            self.reset(rows)
+            return
+        with self.lock:
+            if not self.ready:
+                return
+            if start == 1:
+                # En-tête modifié : positions des colonnes à relire
+                self.ready = False
+                return
+            for offset, row in enumerate(rows):
+                self._set_row(start + offset, row)
+
+    def ensure_ready(self, mirror):
+        """Premier calcul complet (une seule fois par processus, puis incrémental)."""
+        if self.ready:
+            return
+        mirror.values(self.ws_name)  # synchro initiale éventuelle, hors verrou
+        with mirror.lock:
+            if not self.ready:
+                self.reset(mirror.values(self.ws_name))
+
+    def summary(self):
+        """Table StatutBL / Magasin / Jour / Nb (une ligne par combinaison)."""
+        with self.lock:
+            items = list(self.counts.items())
+        return pd.DataFrame(
+            [(statut, magasin, jour, n) for (statut, magasin, jour), n in items],
+            columns=['StatutBL', 'Magasin', 'Jour', 'Nb']
+        )
+
+@st.cache_resource(show_spinner=False)
+def get_dashboard_aggregates():
+    aggregates = DashboardAggregates()
+    get_mirror().add_row_listener(aggregates.on_rows)
+    return aggregates
+
+def dashboard_summary():
+    """Table agrégée de l'onglet DATA (voir DashboardAggregates)."""
+    aggregates = get_dashboard_aggregates()
+    try:
+        aggregates.ensure_ready(get_mirror())
+    except Exception as e:
+        # DATA jamais synchronisé et Google Sheets injoignable : indicateurs à zéro
+        st.warning(f"⚠️ Lecture de l'onglet {WS_DATA} impossible : {e}")
+        return pd.DataFrame(columns=['StatutBL', 'Magasin', 'Jour', 'Nb'])
+    return aggregates.summary()
+
+def reception_volume(summary, days=90):
+    """Série journalière du nombre de réceptions par magasin sur les derniers jours."""
+    dated = summary[summary['Jour'] != '']
+    if dated.empty:
+        return pd.DataFrame()
+    volume = dated.pivot_table(index='Jour', columns='Magasin', values='Nb', aggfunc='sum', fill_value=0)
+    volume.index = pd.to_datetime(volume.index)
+    end = volume.index.max()
+    full_range = pd.date_range(end - pd.Timedelta(days=days - 1), end, freq='D')
+    return volume.reindex(full_range, fill_value=0)
+
+def ageing_to_unpack(summary, today=None):
+    """Réceptions « À déballer » par magasin et tranche d'ancienneté (jours depuis la livraison)."""
+    today = pd.Timestamp(today or datetime.now().date())
+    pending = summary[summary['StatutBL'] == 'À déballer']
+    if pending.empty:
+        return pd.DataFrame()
+    age = (today - pd.to_datetime(pending['Jour'].where(pending['Jour'] != ''))).dt.days
+    labels = pd.Series("Date inconnue", index=pending.index)
+    for low, high, label in AGEING_BUCKETS:
+        labels[(age >= low) & ((age <= high) if high is not None else True)] = label
+    order = [b[2] for b in AGEING_BUCKETS] + ["Date inconnue"]
+    table = pending.assign(Tranche=labels).pivot_table(index='Magasin', columns='Tranche', values='Nb', aggfunc='sum', fill_value=0)
+    return table.reindex(columns=[c for c in order if c in table.columns])
+
+# Clé des lignes des onglets modifiés cellule par cellule (save_cell_edits)
+SHEET_KEYS = {
+    WS_DATA: 'NumReception',
+    WS_TRANSPORT: 'NumTransport',
+}
+
+def _contiguous_runs(col_indexes):
+    """[1, 2, 3, 7] -> [[1, 2, 3], [7]] pour regrouper les cellules voisines d'une ligne."""
+    runs = []
+    for c in sorted(col_indexes):
+        if runs and c == runs[-1][-1] + 1:
+            runs[-1].append(c)
+        else:
+            runs.append([c])
+    return runs
+
+def rows_in_sheet_order(df, positions):
+    """Lignes (listes de textes) placées selon la position des colonnes dans la feuille."""
+    if df.empty:
+        return []
+    width = max(positions.values()) + 1
+    rows = []
+    for values in df.itertuples(index=False):
+        row = [''] * width
+        for col, value in zip(df.columns, values):
+            row[positions[col]] = value
+        rows.append(row)
+    return rows
+
+def _send_diff(ws_name, updates, new_rows=(), priority=PRIORITY_WRITE):
+    """
+    Envoie des mises à jour (un batch_update) et des lignes à ajouter. Si Google
+    Sheets est indisponible, elles sont gardées dans la file locale et poussées plus tard.
+    """
+    def _apply_diff(ws):
+        if updates:
+            ws.batch_update(updates)
+        if new_rows:
+            ws.append_rows(new_rows, table_range='A1')
     try:
-        gc = authenticate_gsheet()
-        if not gc: return False
-        sh = gc.open_by_key(SHEET_ID)
-        ws = sh.worksheet(ws_name)
-        # Conversion de toutes les données en chaînes pour éviter les erreurs de type
-        data_to_save = [df.columns.values.tolist()] + df.astype(str).values.tolist()
-        ws.clear()
-        ws.update('A1', data_to_save)
+        run_on_worksheet(ws_name, _apply_diff, priority=priority)
+    except Exception as e:
+        if not _is_transient_error(e):
+            raise
+        if updates:
+            get_mirror().enqueue(ws_name, 'update', updates)
+        if new_rows:
+            get_mirror().enqueue(ws_name, 'append', new_rows)
+        st.warning("⚠️ Google Sheets indisponible : modifications enregistrées localement, synchronisation en attente.")
+        return
+    _after_write(ws_name, updates=updates, appended_rows=new_rows)
+
+# Taille des paquets envoyés par append_rows_gsheet
+APPEND_CHUNK_SIZE = 500
+
+@traced(target=lambda ws_name, *a, **k: ws_name, size=_first_len)
+def append_rows_gsheet(ws_name, df, chunk_size=APPEND_CHUNK_SIZE):
+    """
+    Ajoute les lignes d'un DataFrame à la suite d'un onglet, sans relire ni réécrire
+    l'existant. Envoi par paquets de chunk_size lignes ; l'ordonnanceur gère le quota.
+    """
+    written = 0
+    try:
+        if not authenticate_gsheet(): return False
+        snapshot = _get_worksheet_frame(ws_name)
+        positions = dict(snapshot.attrs.get('positions', {})) or {c: i for i, c in enumerate(df.columns)}
+        unknown = [c for c in df.columns if c not in positions]
+        if unknown:
+            raise ValueError(f"Colonnes absentes de l'onglet {ws_name} : {', '.join(unknown)}")
+        
+        rows = rows_in_sheet_order(df.fillna('').astype(str), positions)
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                # Import en masse : priorité des lectures, pour ne pas bloquer les autres postes
+                run_on_worksheet(ws_name, lambda ws: ws.append_rows(chunk, table_range='A1'), priority=PRIORITY_READ)
+            except Exception as e:
+                if not _is_transient_error(e):
+                    raise
+                # Google Sheets indisponible : le reste est mis en attente dans la copie locale
+                get_mirror().enqueue(ws_name, 'append', rows[start:])
+                st.warning(f"⚠️ Google Sheets indisponible : {len(rows) - start} ligne(s) en attente de synchronisation.")
+                return True
+            written += len(chunk)
         return True
     except Exception as e:
-        st.error(f"❌ Erreur sauvegarde : {e}")
+        st.error(f"❌ Erreur d'ajout ({written} ligne(s) déjà écrite(s)) : {e}")
         return False
+    finally:
+        if written:
+            _after_write(ws_name, appended_rows=True)
 
 def to_excel(df):
     output = io.BytesIO()
@@ -125,23 +1507,131 @@ def to_excel(df):
         df.to_excel(writer, index=False, sheet_name='Refus')
     return output.getvalue()
 
+@traced(target=lambda ws_name, *a, **k: ws_name, size=lambda a, k, r: 1)
 def add_row_gsheet(ws_name, row_list):
+    """
+    Ajout différé d'une ligne : elle est inscrite dans le journal local (visible tout
+    de suite dans l'application) puis envoyée à Google Sheets par le worker, regroupée
+    avec les autres ajouts du même onglet.
+    """
     try:
-        gc = authenticate_gsheet()
-        if not gc: return False
-        sh = gc.open_by_key(SHEET_ID)
-        ws = sh.worksheet(ws_name)
-        ws.append_row(row_list)
+        get_mirror().enqueue(ws_name, 'append', [list(row_list)])
         return True
     except Exception as e:
         st.error(f"❌ Erreur GSheet : {e}")
         return False
 		
+# --- ARCHIVAGE DES RÉCEPTIONS CLÔTURÉES ---
+# Onglets annuels ARCHIVE_2025, ARCHIVE_2026... (année de clôture, à défaut de livraison)
+ARCHIVE_PREFIX = 'ARCHIVE_'
+ARCHIVE_AFTER_DAYS = 180   # âge minimal d'une réception clôturée avant archivage (secrets : [app] archive_after_days)
+
+def archive_tab(year):
+    return f"{ARCHIVE_PREFIX}{year}"
+
+def list_archive_tabs():
+    """Onglets d'archive du classeur, plus récents en premier."""
+    titles = get_spreadsheet_tabs()[1]
+    return tuple(sorted((t for t in titles if re.fullmatch(re.escape(ARCHIVE_PREFIX) + r'\d{4}', t)), reverse=True))
+
+def get_reception_keys():
+    """NumReception connus, onglet DATA et archives (contrôle des doublons à l'import)."""
+    keys = get_key_index(WS_DATA, 'NumReception')
+    for tab in list_archive_tabs():
+        keys = keys | get_key_index(tab, 'NumReception')
+    return keys
+
+def select_archivable(df, min_age_days, today=None):
+    """
+    Lignes de DATA (ordre de la feuille) à archiver : statut clôturé (DONE_STATUSES)
+    et date de clôture, ou à défaut de livraison, antérieure à min_age_days jours.
+    Colonne ajoutée : Année (onglet d'archive de destination).
+    """
+    if df.empty or 'StatutBL' not in df.columns:
+        return df.assign(Année=pd.Series(dtype='int64'))
+    closing = _to_date(df['DateClotureDeballage']) if 'DateClotureDeballage' in df.columns else pd.Series(pd.NaT, index=df.index)
+    if 'Livré le' in df.columns:
+        closing = closing.fillna(_to_date(df['Livré le']))
+    limit = pd.Timestamp(today or datetime.now().date()) - pd.Timedelta(days=int(min_age_days))
+    keep = df['StatutBL'].isin(DONE_STATUSES).to_numpy() & (closing < limit).to_numpy()
+    return df[keep].assign(Année=closing[keep].dt.year.astype('int64'))
+
+def _ensure_archive_tab(tab, header):
+    """Crée l'onglet d'archive (avec l'en-tête de DATA) s'il n'existe pas encore."""
+    if tab not in list_archive_tabs():
+        create_worksheet(tab, header)
+
+@traced('archive', target=lambda *a, **k: WS_DATA, size=lambda a, k, r: sum(r.values()))
+def archive_closed_receptions(min_age_days=None, today=None, dry_run=False):
+    """
+    Déplace les réceptions clôturées depuis plus de min_age_days jours de DATA vers
+    les onglets annuels, pour que DATA (lu par toutes les pages) reste de taille bornée.
+    1. ajout dans ARCHIVE_<année> des lignes absentes de l'archive : après un échec,
+       l'archivage peut être relancé sans créer de doublon ;
+    2. suppression des lignes de DATA en un seul batch_update, après avoir vérifié
+       sur la feuille que chaque ligne porte toujours le NumReception attendu.
+    Retourne {onglet d'archive: nombre de lignes} ; dry_run=True ne fait que compter.
+    """
+    min_age_days = get_setting("archive_after_days", ARCHIVE_AFTER_DAYS) if min_age_days is None else min_age_days
+    mirror = get_mirror()
+    if not dry_run:
+        if mirror.pending_count(WS_DATA):
+            raise RuntimeError("Modifications DATA en attente de synchronisation, archivage reporté.")
+        # Les positions de lignes doivent être celles de la feuille à cet instant
+        mirror.pull(WS_DATA, full=True)
+    snapshot = _get_worksheet_frame(WS_DATA)
+    selected = select_archivable(snapshot, min_age_days, today)
+    counts = {archive_tab(year): int(n) for year, n in selected['Année'].value_counts().sort_index().items()}
+    if dry_run or selected.empty:
+        return counts
+    
+    positions = snapshot.attrs.get('positions') or {c: i for i, c in enumerate(snapshot.columns)}
+    header = [''] * (max(positions.values()) + 1)
+    for col, i in positions.items():
+        header[i] = col
+    for year, group in selected.groupby('Année'):
+        tab = archive_tab(year)
+        _ensure_archive_tab(tab, header)
+        new = group[~group['NumReception'].astype(str).isin(get_key_index(tab, 'NumReception'))]
+        rows = rows_in_sheet_order(new.drop(columns=['Année']), positions)
+        if rows:
+            run_on_worksheet(tab, lambda ws: ws.append_rows(rows, table_range='A1'))
+            _after_write(tab, appended_rows=rows)
+    
+    # Lignes de la feuille (1-based) à supprimer, vérifiées juste avant la suppression
+    sheet_rows = selected.index.to_numpy() + 2
+    sheet_keys = run_on_worksheet(WS_DATA, lambda ws: ws.col_values(positions['NumReception'] + 1))
+    for row, key in zip(sheet_rows, selected['NumReception'].astype(str)):
+        if row > len(sheet_keys) or sheet_keys[row - 1] != key:
+            mirror.mark_stale(WS_DATA)
+            raise RuntimeError("DATA a été modifié pendant l'archivage : relancez l'archivage (les lignes déjà archivées ne seront pas dupliquées).")
+    def _delete(ws):
+        # Du bas vers le haut : chaque suppression ne décale pas les suivantes
+        delete_requests = [
+            {'deleteDimension': {'range': {'sheetId': ws.id, 'dimension': 'ROWS', 'startIndex': int(run[0]) - 1, 'endIndex': int(run[-1])}}}
+            for run in reversed(_contiguous_runs(sheet_rows))
+        ]
+        return ws.spreadsheet.batch_update({'requests': delete_requests})
+    run_on_worksheet(WS_DATA, _delete)
+    mirror.mark_stale(WS_DATA)
+    try:
+        # Relecture complète tout de suite : copie locale et agrégats du tableau de bord
+        # (recalculés par la relecture) sans les lignes archivées
+        mirror.pull(WS_DATA, full=True)
+    except Exception:
+        pass  # onglet resté marqué périmé : relu au prochain passage du worker
+    invalidate_data_cache(WS_DATA)
+    return counts
+
 #DEF TABLEAU MISE EN PAGE
-def get_standard_grid_options(df, page_size=20, editable_cols=[]):
+def get_standard_grid_options(df, page_size=20, editable_cols=[], server_side=False, key_col='NumReception'):
     """
     FONCTION CENTRALISÉE : Configure tous les tableaux AgGrid du site.
     Active la saisie libre, le filtrage et les options d'export.
+    server_side=True : filtre et pagination sont faits en Python (render_paged_grid),
+    la grille n'affiche que la page reçue.
+    Avec des colonnes éditables, les cellules modifiées sont notées par le navigateur
+    (track_cell_edits) si la clé key_col est affichée.
     """
     gb = GridOptionsBuilder.from_dataframe(df)
     
@@ -150,7 +1640,7 @@ def get_standard_grid_options(df, page_size=20, editable_cols=[]):
         resizable=True, 
         sortable=True, 
         filter='agTextColumnFilter',
-        floatingFilter=True,
+        floatingFilter=not server_side,
         minWidth=100,
         editable=False
     )
@@ -168,7 +1658,7 @@ def get_standard_grid_options(df, page_size=20, editable_cols=[]):
     
     # Pagination
     gb.configure_pagination(
-        enabled=True, 
+        enabled=not server_side, 
         paginationAutoPageSize=False, 
         paginationPageSize=page_size
     )
@@ -176,65 +1666,662 @@ def get_standard_grid_options(df, page_size=20, editable_cols=[]):
     # Permet la sélection multiple pour l'extraction
     gb.configure_selection(selection_mode="multiple", use_checkbox=True)
     
-    return gb.build()
+    grid_options = gb.build()
+    if editable_cols and key_col in df.columns:
+        track_cell_edits(grid_options, key_col)
+    return grid_options
 
-#DEF FEUILLE REFUS
-def add_refus_row(row_list):
-    """Ajoute réellement la ligne dans l'onglet REFUS"""
+@traced('grid', size=lambda a, k, r: len(a[0]) if a else len(k['df']))
+def render_custom_grid(df, editable_cols=[], status_options=None, height=500):
+    """
+    Tableau AgGrid standard (get_standard_grid_options) ; la colonne StatutBL
+    devient une liste déroulante quand status_options est fourni. Une grille
+    éditable ne renvoie que les cellules modifiées : voir grid_edits.
+    """
+    grid_options = get_standard_grid_options(df, editable_cols=editable_cols)
+    if status_options and 'StatutBL' in editable_cols:
+        for col_def in grid_options['columnDefs']:
+            if col_def.get('field') == 'StatutBL':
+                col_def['cellEditor'] = 'agSelectCellEditor'
+                col_def['cellEditorParams'] = {'values': status_options}
+    tracked = 'onCellValueChanged' in grid_options
+    return AgGrid(
+        df,
+        gridOptions=grid_options,
+        height=height,
+        theme='balham',
+        update_mode=GridUpdateMode.VALUE_CHANGED,
+        data_return_mode=DataReturnMode.CUSTOM if tracked else DataReturnMode.AS_INPUT,
+        custom_jscode_for_grid_return=EDITS_RETURN_JS if tracked else None,
+        allow_unsafe_jscode=tracked
+    )
+
+#DEF SAISIE CELLULE PAR CELLULE
+# Une cellule modifiée dans une grille : clé de la ligne, colonne, valeur chargée, valeur saisie
+CellEdit = namedtuple('CellEdit', ['key', 'column', 'old', 'new'])
+EditResult = namedtuple('EditResult', ['ok', 'written', 'conflicts'])
+
+# Journal tenu par le navigateur : première valeur chargée et dernière saisie de chaque
+# cellule ; une cellule remise à sa valeur d'origine en sort.
+EDIT_LOG_JS = """
+function(params) {
+    const edits = params.api.__cellEdits = params.api.__cellEdits || {};
+    const text = (v) => (v === null || v === undefined) ? '' : String(v);
+    const key = text(params.data[__KEY__]);
+    const column = params.colDef.field;
+    const id = JSON.stringify([key, column]);
+    if (!(id in edits)) edits[id] = {key: key, column: column, old: text(params.oldValue)};
+    edits[id].new = text(params.newValue);
+    if (edits[id].new === edits[id].old) delete edits[id];
+}
+"""
+# Retour de la grille vers Python : le journal seul, jamais les lignes
+EDITS_RETURN_JS = JsCode("""
+function({streamlitRerunEventTriggerName, eventData}) {
+    return {edits: Object.values(eventData.api.__cellEdits || {})};
+}
+""")
+
+def track_cell_edits(grid_options, key_col='NumReception'):
+    """Ajoute aux options AgGrid le journal des cellules modifiées (lu par grid_edits)."""
+    grid_options['onCellValueChanged'] = JsCode(EDIT_LOG_JS.replace('__KEY__', json.dumps(key_col)))
+    return grid_options
+
+def grid_edits(grid_res):
+    """Cellules modifiées renvoyées par une grille suivie (track_cell_edits) -> [CellEdit]."""
+    edits = grid_res.get('edits') if grid_res is not None else None
+    return [CellEdit(str(e['key']), e['column'], e.get('old', ''), e.get('new', '')) for e in edits or []]
+
+@traced(target=lambda ws_name, *a, **k: ws_name, size=lambda a, k, r: r.written)
+def save_cell_edits(ws_name, edits, key_col=None):
+    """
+    Enregistre des modifications cellule par cellule (CellEdit). Seules les lignes
+    concernées sont relues sur la feuille (un batch_get) pour vérifier chaque cellule :
+      - valeur actuelle = valeur chargée : la saisie est écrite ;
+      - valeur actuelle = valeur saisie : déjà à jour, rien à écrire ;
+      - sinon la cellule a été modifiée entre-temps par quelqu'un d'autre : elle
+        n'est pas écrasée et figure dans les conflits.
+    Retourne EditResult(ok, cellules écrites, conflits).
+    """
     try:
-        gc = authenticate_gsheet()
-        if not gc: return False
-        sh = gc.open_by_key(SHEET_ID)
-        ws = sh.worksheet(WS_REFUS)
-        ws.append_row(row_list)
-        return True
+        key_col = key_col or SHEET_KEYS.get(ws_name)
+        positions = get_header_map(ws_name)
+        row_index = get_row_index(ws_name, key_col)
+        conflicts = []
+        def _conflict(edit, current):
+            conflicts.append({key_col: edit.key, 'Colonne': edit.column, 'Valeur chargée': edit.old,
+                              'Votre saisie': edit.new, 'Valeur actuelle': current})
+        
+        by_row = {}
+        for edit in {(e.key, e.column): e for e in edits}.values():
+            if edit.column not in positions or edit.key not in row_index.index:
+                _conflict(edit, "(ligne ou colonne introuvable)")
+            else:
+                by_row.setdefault(int(row_index[edit.key]) + 2, []).append(edit)
+        if not by_row:
+            return EditResult(True, 0, conflicts)
+        
+        sheet_rows = sorted(by_row)
+        try:
+            fetched = run_on_worksheet(ws_name, lambda ws: ws.batch_get([f"{r}:{r}" for r in sheet_rows]), priority=PRIORITY_WRITE)
+            current_rows = dict(zip(sheet_rows, (list(v[0]) if v else [] for v in fetched)))
+        except Exception as e:
+            if not _is_transient_error(e):
+                raise
+            # Google Sheets indisponible : contrôle sur la copie locale
+            current_rows = get_mirror().rows_at(ws_name, sheet_rows)
+        
+        def _cell(current, col):
+            return current[positions[col]] if positions[col] < len(current) else ''
+        
+        updates = []
+        written = 0
+        for row in sheet_rows:
+            current = current_rows.get(row, [])
+            if _cell(current, key_col) != by_row[row][0].key:
+                # Ligne déplacée (suppression, archivage) depuis le chargement
+                get_mirror().mark_stale(ws_name)
+                for edit in by_row[row]:
+                    _conflict(edit, "(ligne déplacée, rechargez la page)")
+                continue
+            cells = {}
+            for edit in by_row[row]:
+                value = _cell(current, edit.column)
+                if value == edit.new:
+                    continue
+                if value != edit.old:
+                    _conflict(edit, value)
+                    continue
+                cells[positions[edit.column]] = edit.new
+            for run in _contiguous_runs(cells):
+                start = gspread.utils.rowcol_to_a1(row, run[0] + 1)
+                end = gspread.utils.rowcol_to_a1(row, run[-1] + 1)
+                updates.append({'range': start if start == end else f"{start}:{end}", 'values': [[cells[c] for c in run]]})
+            written += len(cells)
+        if updates:
+            _send_diff(ws_name, updates)
+        return EditResult(True, written, conflicts)
     except Exception as e:
-        st.error(f"❌ Erreur lors de l'écriture dans Google Sheets : {e}")
+        st.error(f"❌ Erreur sauvegarde : {e}")
+        return EditResult(False, 0, [])
+
+def save_grid_edits(ws_name, grid_res):
+    """
+    Bouton « Enregistrer » d'une grille suivie : écrit les cellules modifiées et
+    affiche les conflits. Retourne True si tout est enregistré (la page peut se recharger).
+    """
+    edits = grid_edits(grid_res)
+    if not edits:
+        st.info("Aucune modification à enregistrer.")
+        return False
+    result = save_cell_edits(ws_name, edits)
+    if result.ok and result.conflicts:
+        st.warning(f"⚠️ {result.written} cellule(s) enregistrée(s) ; {len(result.conflicts)} cellule(s) modifiée(s) "
+                   "entre-temps par un autre poste n'ont pas été écrasées :")
+        st.dataframe(pd.DataFrame(result.conflicts), hide_index=True)
         return False
+    return result.ok
 
-def send_actual_email(destinataires_list, subject, body, attachment=None):
+#DEF TABLEAU PAGINÉ CÔTÉ SERVEUR
+def _sort_key(series):
+    """Tri numérique si toutes les valeurs renseignées sont des nombres, sinon tri texte."""
+    as_num = pd.to_numeric(series, errors='coerce')
+    if as_num[series.astype(str) != ''].notna().all():
+        return as_num
+    return series.astype(str).str.lower()
+
+def filter_sort_page(df, query="", search_col=None, sort_col=None, ascending=True, page=1, page_size=50):
     """
-    Envoie un e-mail réel.
-    destinataires_list : Liste Python d'adresses e-mails propres.
+    Filtre (texte contenu, insensible à la casse), trie et découpe un DataFrame.
+    Retourne (page_df, nb_lignes_filtrées, nb_pages) ; seule page_df est envoyée au navigateur.
     """
-    try:
-        if "email" not in st.secrets: 
-            return False, "Configuration e-mail manquante."
+    view = df
+    if query:
+        cols = [search_col] if search_col else list(df.columns)
+        mask = np.zeros(len(df), dtype=bool)
+        for col in cols:
+            mask |= df[col].astype(str).str.contains(query, case=False, regex=False).to_numpy()
+        view = df[mask]
+    if sort_col:
+        view = view.sort_values(sort_col, ascending=ascending, key=_sort_key, kind='stable')
+    
+    total = len(view)
+    nb_pages = max(1, -(-total // page_size))
+    page = min(max(1, page), nb_pages)
+    return view.iloc[(page - 1) * page_size:page * page_size], total, nb_pages
+
+@traced('grid', target=lambda df, key, *a, **k: key, size=lambda a, k, r: len(r))
+def render_paged_grid(df, key, page_size=50, height=500):
+    """
+    Historique paginé côté serveur : recherche, tri et page sont choisis avec des
+    widgets Streamlit et calculés en Python ; AgGrid ne reçoit que la page visible.
+    """
+    all_cols = "(toutes)"
+    c1, c2, c3, c4 = st.columns([3, 2, 2, 1])
+    query = c1.text_input("🔎 Rechercher", key=f"{key}_query")
+    search_col = c2.selectbox("Dans la colonne", [all_cols] + list(df.columns), key=f"{key}_search_col")
+    sort_col = c3.selectbox("Trier par", ["(ordre actuel)"] + list(df.columns), key=f"{key}_sort_col")
+    descending = c4.checkbox("Décroissant", key=f"{key}_desc")
+    
+    search_col = None if search_col == all_cols else search_col
+    sort_col = sort_col if sort_col in df.columns else None
+    
+    # Retour en page 1 dès que la recherche ou le tri change
+    page_key = f"{key}_page"
+    criteria = (query, search_col, sort_col, descending)
+    if st.session_state.get(f"{key}_criteria") != criteria:
+        st.session_state[f"{key}_criteria"] = criteria
+        st.session_state[page_key] = 1
+    
+    _, total, nb_pages = filter_sort_page(df, query, search_col, sort_col, not descending, 1, page_size)
+    if st.session_state.get(page_key, 1) > nb_pages:
+        st.session_state[page_key] = nb_pages
+    page = st.number_input(f"Page (sur {nb_pages})", min_value=1, max_value=nb_pages, step=1, key=page_key)
+    page_df, total, nb_pages = filter_sort_page(df, query, search_col, sort_col, not descending, page, page_size)
+    page_df = display_frame(page_df)
+    
+    AgGrid(
+        page_df,
+        gridOptions=get_standard_grid_options(page_df, page_size=page_size, server_side=True),
+        height=height,
+        theme='balham',
+        update_mode=GridUpdateMode.NO_UPDATE,
+        key=f"{key}_grid"
+    )
+    st.caption(f"{total} ligne(s) trouvée(s) — page {page}/{nb_pages}")
+    return page_df
+
+# --- IMPORT EXCEL PAR PAQUETS ---
+# Nombre de lignes Excel lues et contrôlées à la fois
+IMPORT_CHUNK_SIZE = 2000
+# Champs gérés plus tard dans l'application, initialisés vides à l'import
+IMPORT_EMPTY_COLS = ['Emplacement', 'NomDeballage', 'DateClotureDeballage', 'LitigesCompta', 'Commentaire_litige', 'NumTransport']
+IMPORT_ACCEPTED = "Acceptée"
+IMPORT_REJECTED = "Rejetée"
+
+def _iter_excel_rows(uploaded_file):
+    """
+    Lit le premier onglet ligne par ligne sans charger le classeur en mémoire.
+    Renvoie (nombre de lignes estimé ou None, itérateur de tuples) ; la première
+    ligne est l'en-tête.
+    """
+    data = uploaded_file.getvalue()
+    if uploaded_file.name.lower().endswith('.xls'):
+        book = xlrd.open_workbook(file_contents=data, on_demand=True)
+        sheet = book.sheet_by_index(0)
+        def _rows():
+            for i in range(sheet.nrows):
+                row = []
+                for cell in sheet.row(i):
+                    if cell.ctype == xlrd.XL_CELL_DATE:
+                        row.append(xlrd.xldate_as_datetime(cell.value, book.datemode))
+                    elif cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                        row.append(None)
+                    else:
+                        row.append(cell.value)
+                yield tuple(row)
+            book.release_resources()
+        return sheet.nrows, _rows()
+    
+    book = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    sheet = book.worksheets[0]
+    def _rows():
+        try:
+            yield from sheet.iter_rows(values_only=True)
+        finally:
+            book.close()
+    return sheet.max_row, _rows()
+
+def iter_excel_chunks(uploaded_file, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Découpe le fichier en DataFrames de chunk_size lignes (colonnes = en-tête du
+    fichier). Chaque paquet porte la ligne Excel de départ dans attrs['first_line'].
+    Renvoie (nombre de lignes de données estimé ou None, générateur de paquets).
+    """
+    nrows, rows = _iter_excel_rows(uploaded_file)
+    header = next(rows, None)
+    if header is None:
+        return 0, iter(())
+    columns = [str(h).strip() if h is not None else f"Colonne {i + 1}" for i, h in enumerate(header)]
+    
+    def _chunks():
+        line = 2
+        buffer = []
+        width = len(columns)
+        for row in rows:
+            buffer.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(buffer) == chunk_size:
+                yield _rows_to_chunk(buffer, columns, line)
+                line += len(buffer)
+                buffer = []
+        if buffer:
+            yield _rows_to_chunk(buffer, columns, line)
+    return (nrows - 1 if nrows else None), _chunks()
+
+def _rows_to_chunk(buffer, columns, first_line):
+    chunk = pd.DataFrame.from_records(buffer, columns=columns)
+    chunk.index = pd.RangeIndex(first_line, first_line + len(chunk))
+    return chunk
+
+def _to_number(series):
+    """Nombres Excel ou texte (« 1 234,50 € ») -> float, NaN si vide ou illisible."""
+    text = series.astype(object).where(series.notna(), '').astype(str)
+    text = text.str.replace(r'[\s\xa0€]', '', regex=True).str.replace(',', '.', regex=False)
+    return pd.to_numeric(text.where(text != ''), errors='coerce')
+
+def _number_to_text(numbers):
+    """Float -> texte, sans « .0 » pour les valeurs entières ; vide si NaN."""
+    integral = numbers.notna() & (numbers == numbers.round())
+    text = numbers.astype(object).where(numbers.notna(), '').astype(str)
+    text[integral] = numbers[integral].astype('int64').astype(str)
+    return text
+
+def normalize_import_chunk(chunk):
+    """
+    Mappe un paquet Excel vers COLUMNS_DATA et normalise les types par colonne.
+    Renvoie (lignes au format DATA, motif de rejet par ligne — vide si valide).
+    """
+    df = chunk.rename(columns=COLUMN_MAPPING).reindex(columns=COLUMNS_DATA)
+    reasons = pd.Series('', index=df.index, dtype=object)
+    
+    def _flag(mask, reason):
+        reasons[mask & (reasons == '')] = reason
+    
+    # Texte brut : cellules vides -> "", espaces retirés
+    out = df.astype(object).where(df.notna(), '').astype(str).apply(lambda s: s.str.strip())
+    
+    # NumReception : une cellule numérique (12345.0) redevient "12345" ; le texte
+    # (« 00123 », « 1E5 ») est gardé tel quel, c'est la clé des doublons
+    is_number = df['NumReception'].map(lambda v: isinstance(v, (int, float, np.number)) and not isinstance(v, bool))
+    num = pd.to_numeric(df['NumReception'].where(is_number), errors='coerce')
+    out['NumReception'] = out['NumReception'].where(num.isna(), _number_to_text(num))
+    _flag(out['NumReception'] == '', "N° de réception manquant")
+    
+    for col, reason in (('Mt TTC', "Montant invalide"), ('Qté', "Quantité invalide")):
+        values = _to_number(df[col])
+        _flag(values.isna() & (out[col] != ''), reason)
+        out[col] = out[col].where(values.isna(), _number_to_text(values))
+    
+    raw_dates = df['Livré le']
+    is_datetime = raw_dates.map(lambda v: isinstance(v, datetime))
+    dates = pd.to_datetime(raw_dates.where(is_datetime), errors='coerce')
+    from_text = ~is_datetime & (out['Livré le'] != '')
+    if from_text.any():
+        # ISO d'abord, puis jj/mm/aaaa (dayfirst inverserait jour et mois des dates ISO)
+        dates[from_text] = _to_date(out['Livré le'][from_text])
+    _flag(dates.isna() & (out['Livré le'] != ''), "Date de livraison invalide")
+    out['Livré le'] = out['Livré le'].where(dates.isna(), dates.dt.strftime('%Y-%m-%d'))
+    
+    out['StatutBL'] = "À déballer"
+    for c in IMPORT_EMPTY_COLS:
+        out[c] = ""
+    return out, reasons
+
+@traced('import_excel', size=lambda a, k, r: len(r[1]))
+def import_excel_file(uploaded_file, existing_keys, on_progress=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Lit, normalise et contrôle le fichier par paquets. Une ligne est rejetée si elle
+    est invalide, si son N° est déjà en base (existing_keys) ou déjà vu plus haut
+    dans le fichier. Renvoie (lignes acceptées au format DATA, rapport ligne par ligne).
+    on_progress(lignes traitées, total estimé ou None) est appelé après chaque paquet.
+    """
+    total, chunks = iter_excel_chunks(uploaded_file, chunk_size)
+    seen = set()
+    accepted, reports = [], []
+    done = 0
+    for chunk in chunks:
+        rows, reasons = normalize_import_chunk(chunk)
+        keys = rows['NumReception']
+        in_base = np.fromiter((k in existing_keys for k in keys), dtype=bool, count=len(keys))
+        in_file = keys.duplicated().to_numpy() | np.fromiter((k in seen for k in keys), dtype=bool, count=len(keys))
+        reasons[in_file & (reasons == '').to_numpy()] = "Doublon dans le fichier"
+        reasons[in_base & (reasons == '').to_numpy()] = "Doublon : déjà en base"
+        seen.update(keys[keys != ''])
         
+        ok = (reasons == '').to_numpy()
+        accepted.append(rows[ok])
+        reports.append(pd.DataFrame({
+            'Ligne Excel': rows.index,
+            'NumReception': keys.to_numpy(),
+            'Résultat': np.where(ok, IMPORT_ACCEPTED, IMPORT_REJECTED),
+            'Motif': reasons.to_numpy(),
+        }))
+        done += len(rows)
+        if on_progress:
+            on_progress(done, total)
+    
+    if not reports:
+        return pd.DataFrame(columns=COLUMNS_DATA), pd.DataFrame(columns=['Ligne Excel', 'NumReception', 'Résultat', 'Motif'])
+    return pd.concat(accepted, ignore_index=True), pd.concat(reports, ignore_index=True)
+
+#DEF FEUILLE REFUS
+def add_refus_row(row_list):
+    """Ajoute réellement la ligne dans l'onglet REFUS"""
+    return add_row_gsheet(WS_REFUS, row_list)
+
+# --- CONNEXIONS SMTP PARTAGÉES ---
+SMTP_POOL_SIZE = 2        # connexions authentifiées ouvertes au maximum
+SMTP_IDLE_TIMEOUT = 120   # secondes avant de fermer une connexion inutilisée
+SMTP_TIMEOUT = 30
+
+# Erreurs propres à un message : la session reste utilisable pour les suivants
+SMTP_MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+class SmtpPool:
+    """
+    Connexions SMTP (STARTTLS + login) réutilisées d'un envoi à l'autre.
+    Une connexion inactive est vérifiée par NOOP avant d'être reprise, fermée
+    au-delà de SMTP_IDLE_TIMEOUT, et rouverte si le serveur l'a coupée.
+    """
+    def __init__(self, size=SMTP_POOL_SIZE, idle_timeout=SMTP_IDLE_TIMEOUT):
+        self.semaphore = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle_timeout = idle_timeout
+        self.idle = []  # [(connexion, dernier usage)]
+
+    def _connect(self):
         config = st.secrets["email"]
-        sender = extreme_clean(config["sender_email"])
-        
-        # Nettoyage de la liste des destinataires
-        clean_dests = [extreme_clean(m) for m in destinataires_list if "@" in str(m)]
-        if not clean_dests:
-            return False, "Aucun destinataire valide."
-
-        msg = MIMEMultipart()
-        msg['From'] = sender
-        msg['To'] = ", ".join(clean_dests)
-        msg['Subject'] = Header(subject, 'utf-8').encode()
-        msg.attach(MIMEText(body, 'plain', 'utf-8'))
-        
-        if attachment is not None:
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(attachment.read())
-            encoders.encode_base64(part)
-            part.add_header('Content-Disposition', f'attachment; filename="{attachment.name}"')
-            msg.attach(part)
-            
-        server = smtplib.SMTP(extreme_clean(config["smtp_server"]), int(config["smtp_port"]))
+        server = smtplib.SMTP(extreme_clean(config["smtp_server"]), int(config["smtp_port"]), timeout=SMTP_TIMEOUT)
         server.starttls()
-        server.login(sender, extreme_clean(config["sender_password"]))
-        # On passe la liste Python directement
-        server.sendmail(sender, clean_dests, msg.as_string())
-        server.quit()
-        return True, "Succès"
-    except Exception as e:
-        return False, str(e)
+        server.login(extreme_clean(config["sender_email"]), extreme_clean(config["sender_password"]))
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _acquire(self):
+        while True:
+            with self.lock:
+                item = self.idle.pop() if self.idle else None
+            if item is None:
+                return self._connect()
+            server, last_used = item
+            if time.monotonic() - last_used <= self.idle_timeout:
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except OSError:
+                    pass
+            self._close(server)
+
+    def _release(self, server):
+        with self.lock:
+            self.idle.append((server, time.monotonic()))
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for server, _ in idle:
+            self._close(server)
+
+    def send_messages(self, messages):
+        """
+        Envoie [(expéditeur, destinataires, message texte)] sur une seule session
+        authentifiée. Une erreur de connexion provoque une reconnexion et un
+        nouvel essai du message en cours. Retourne [(succès, détail)] dans l'ordre.
+        """
+        results = []
+        with self.semaphore:
+            server = None
+            try:
+                for sender, dests, payload in messages:
+                    for attempt in (1, 2):
+                        try:
+                            if server is None:
+                                server = self._acquire()
+                            server.sendmail(sender, dests, payload)
+                            results.append((True, "Succès"))
+                            break
+                        except SMTP_MESSAGE_ERRORS as e:
+                            results.append((False, str(e)))
+                            try:
+                                server.rset()
+                            except OSError:
+                                server.close()
+                                server = None
+                            break
+                        except Exception as e:
+                            # Connexion perdue ou refusée : on repart d'une connexion neuve
+                            if server is not None:
+                                server.close()
+                                server = None
+                            if attempt == 2:
+                                results.append((False, str(e)))
+            finally:
+                if server is not None:
+                    self._release(server)
+        return results
+
+@st.cache_resource(show_spinner=False)
+def get_smtp_pool():
+    return SmtpPool()
+
+def build_email(destinataires_list, subject, body, attachment=None):
+    """
+    Prépare un e-mail : retourne (expéditeur, destinataires nettoyés, message texte).
+    Lève ValueError si la configuration ou les destinataires sont invalides.
+    """
+    if "email" not in st.secrets: 
+        raise ValueError("Configuration e-mail manquante.")
+    
+    config = st.secrets["email"]
+    sender = extreme_clean(config["sender_email"])
+    
+    # Nettoyage de la liste des destinataires
+    clean_dests = [extreme_clean(m) for m in destinataires_list if "@" in str(m)]
+    if not clean_dests:
+        raise ValueError("Aucun destinataire valide.")
+
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = ", ".join(clean_dests)
+    msg['Subject'] = Header(subject, 'utf-8').encode()
+    msg.attach(MIMEText(body, 'plain', 'utf-8'))
+    
+    if attachment is not None:
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(attachment.read())
+        encoders.encode_base64(part)
+        part.add_header('Content-Disposition', f'attachment; filename="{attachment.name}"')
+        msg.attach(part)
+    # On passe la liste Python directement
+    return sender, clean_dests, msg.as_string()
+
+@traced('email', size=lambda a, k, r: len(str(a[2] if len(a) > 2 else k.get('body', ''))))
+def send_actual_email(destinataires_list, subject, body, attachment=None):
+    """
+    Envoie un e-mail réel (connexion SMTP réutilisée, voir SmtpPool).
+    destinataires_list : Liste Python d'adresses e-mails propres.
+    """
+    return send_batch_emails([(destinataires_list, subject, body, attachment)])[0]
+
+@traced('email_batch', size=lambda a, k, r: sum(len(str(e[2])) for e in a[0]))
+def send_batch_emails(emails):
+    """
+    Envoie plusieurs e-mails [(destinataires, sujet, corps, pièce jointe)] sur une
+    seule session SMTP authentifiée. Retourne [(succès, détail)] dans le même ordre.
+    """
+    results = [None] * len(emails)
+    prepared, positions = [], []
+    for i, (dests, subject, body, attachment) in enumerate(emails):
+        try:
+            prepared.append(build_email(dests, subject, body, attachment))
+            positions.append(i)
+        except Exception as e:
+            results[i] = (False, str(e))
+    if prepared:
+        try:
+            sent = get_smtp_pool().send_messages(prepared)
+        except Exception as e:
+            sent = [(False, str(e))] * len(prepared)
+        for i, result in zip(positions, sent):
+            results[i] = result
+    return results
+
+# --- RÉDACTION DES MAILS (Gemini) ---
+AI_CACHE_PATH = os.path.join(LOCAL_STORE_DIR, 'ai_cache.json')
+AI_CACHE_SIZE = 500          # textes conservés (les moins récemment utilisés sont évincés)
+AI_TIMEOUT = 4.0             # budget de latence par défaut (secrets : [app] ai_timeout)
+AI_FAILURE_THRESHOLD = 3     # échecs consécutifs avant de passer directement au modèle
+AI_COOLDOWN = 300            # secondes avant de retenter l'API après ouverture du circuit
+
+class AiTextCache:
+    """Mémoïsation LRU des textes générés, clé = prompt normalisé, persistée sur disque."""
+    def __init__(self, path=AI_CACHE_PATH, max_entries=AI_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.entries.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def key(prompt):
+        normalized = " ".join(prompt.lower().split())
+        return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+    def get(self, prompt):
+        with self.lock:
+            key = self.key(prompt)
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, prompt, text):
+        with self.lock:
+            self.entries[self.key(prompt)] = text
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(self.entries, f, ensure_ascii=False)
+                os.replace(self.path + '.tmp', self.path)
+            except OSError:
+                pass
+
+class CircuitBreaker:
+    """Après `threshold` échecs consécutifs, l'API n'est plus appelée pendant `cooldown` secondes."""
+    def __init__(self, threshold=AI_FAILURE_THRESHOLD, cooldown=AI_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # Circuit semi-ouvert : une requête d'essai est autorisée
+                self.opened_at = None
+                self.failures = self.threshold - 1
+                return True
+            return False
+
+    def record(self, success):
+        with self.lock:
+            if success:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.failures >= self.threshold:
+                    self.opened_at = time.monotonic()
+
+@st.cache_resource(show_spinner=False)
+def get_ai_cache():
+    return AiTextCache()
+
+@st.cache_resource(show_spinner=False)
+def get_ai_breaker():
+    return CircuitBreaker()
+
+def template_ai_content(magasin, fournisseur, bl, commentaire, mode):
+    """Texte de secours sans appel réseau."""
+    if mode == "pdc":
+        body = f"Bonjour,\n\nJ'ai reçu ce BL n°{bl} du fournisseur {fournisseur} mais je n'ai pas de commande dans NOZYMAG.\n\nPouvez-vous me donner des indications ?"
+        if commentaire: body += f"\n\nNote : {commentaire}"
+        body += "\n\nCordialement,\nService Logistique"
+        return body
+    else:
+        return f"Bonjour,\n\nNous vous informons du refus du BL {bl} (Fournisseur : {fournisseur}) pour le magasin {magasin}.\nMotif : {commentaire}\n\nCordialement,\nService Logistique"
 
+@traced('ai', target=lambda *a, **k: a[4] if len(a) > 4 else k.get('mode', ''), size=lambda a, k, r: len(r))
 def generate_ai_content(magasin, fournisseur, bl, commentaire, mode):
     """
     Génère le corps du mail via Gemini en fonction du mode : 'refus' ou 'pdc'.
+    Un même prompt n'est généré qu'une fois (AiTextCache) ; sans clé API, au-delà
+    du budget de latence ou quand le circuit est ouvert, le modèle de secours est utilisé.
     """
     if mode == "pdc":
         prompt = (
@@ -254,22 +2341,27 @@ def generate_ai_content(magasin, fournisseur, bl, commentaire, mode):
     else:
         return "Message par défaut : Information logistique."
 
+    cache = get_ai_cache()
+    cached = cache.get(prompt)
+    if cached is not None:
+        return cached
+    
+    breaker = get_ai_breaker()
+    if not apiKey or not breaker.allow():
+        return template_ai_content(magasin, fournisseur, bl, commentaire, mode)
+
     url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-09-2025:generateContent?key={apiKey}"
     
     try:
-        response = requests.post(url, json={"contents": [{"parts": [{"text": prompt}]}]}, timeout=10)
-        return response.json()['candidates'][0]['content']['parts'][0]['text']
+        response = requests.post(url, json={"contents": [{"parts": [{"text": prompt}]}]}, timeout=get_setting("ai_timeout", AI_TIMEOUT))
+        text = response.json()['candidates'][0]['content']['parts'][0]['text']
     except Exception:
         # Fallback manuel si l'API échoue
-        if mode == "pdc":
-            body = f"Bonjour,\n\nJ'ai reçu ce BL n°{bl} du fournisseur {fournisseur} mais je n'ai pas de commande dans NOZYMAG.\n\nPouvez-vous me donner des indications ?"
-            if commentaire: body += f"\n\nNote : {commentaire}"
-            body += "\n\nCordialement,\nService Logistique"
-            return body
-        else:
-            return f"Bonjour,\n\nNous vous informons du refus du BL {bl} (Fournisseur : {fournisseur}) pour le magasin {magasin}.\nMotif : {commentaire}\n\nCordialement,\nService Logistique"
-
-
+        breaker.record(False)
+        return template_ai_content(magasin, fournisseur, bl, commentaire, mode)
+    breaker.record(True)
+    cache.put(prompt, text)
+    return text
 
 def extreme_clean(text):
     """Supprime radicalement les espaces invisibles et caractères non-ASCII pour le protocole SMTP"""
@@ -280,15 +2372,13 @@ def extreme_clean(text):
     return re.sub(r'[^\x20-\x7E]', '', text).strip()
 
 
+@traced(size=lambda a, k, r: len(r))
 def load_mail_list_v2():
     """Charge les noms et emails depuis l'onglet MAIL (Colonnes A et B)"""
     try:
-        gc = authenticate_gsheet()
-        if not gc: return {}
-        sh = gc.open_by_key(SHEET_ID)
-        ws = sh.worksheet(WS_MAILS)
+        if not authenticate_gsheet(): return {}
         # Récupère toutes les valeurs des colonnes A (Nom) et B (Mail)
-        data = ws.get_all_values()
+        data = get_mirror().values(WS_MAILS)
         if not data:
             return {}
         
@@ -307,7 +2397,264 @@ def load_mail_list_v2():
 
         
 
+# --- FILE D'ENVOI DES NOTIFICATIONS (arrière-plan) ---
+OUTBOX_DIR = os.path.join(LOCAL_STORE_DIR, 'outbox')
+OUTBOX_WORKERS = 2
+OUTBOX_MAX_ATTEMPTS = 3
+OUTBOX_RETRY_DELAY = 5  # secondes, doublé à chaque nouvelle tentative
+OUTBOX_HISTORY = 200  # nombre de notifications conservées dans le journal
+
+STATUS_SENDING = "envoi en cours"
+STATUS_SENT = "envoyé"
+STATUS_FAILED = "échec"
+STATUS_ICONS = {STATUS_SENDING: "⏳", STATUS_SENT: "✅", STATUS_FAILED: "❌"}
+
+class NotificationOutbox:
+    """
+    File d'envoi des mails de refus / PDC : rédaction (generate_ai_content) puis
+    envoi (send_actual_email) dans un pool de threads, avec reprises. Le statut
+    de chaque notification est enregistré dans OUTBOX_DIR/jobs.json, et les envois
+    interrompus par un redémarrage sont relancés au démarrage suivant.
+    """
+    def __init__(self, directory=OUTBOX_DIR, workers=OUTBOX_WORKERS):
+        self.directory = directory
+        self.path = os.path.join(directory, 'jobs.json')
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='outbox')
+        os.makedirs(directory, exist_ok=True)
+        self.jobs = self._read()
+        for job in self.jobs.values():
+            if job['status'] == STATUS_SENDING:
+                self.executor.submit(self._process, job['id'])
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return {job['id']: job for job in json.load(f)}
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        jobs = sorted(self.jobs.values(), key=lambda j: j['created_at'])[-OUTBOX_HISTORY:]
+        self.jobs = {job['id']: job for job in jobs}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(jobs, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            job = self.jobs[job_id]
+            job.update(fields)
+            self._write()
+            return dict(job)
+
+    def submit(self, kind, label, recipients, subject, content_args, attachment=None):
+        """Enregistre une notification et la confie au pool ; retourne son identifiant."""
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            'id': job_id, 'kind': kind, 'label': label,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'recipients': list(recipients), 'subject': subject,
+            'content_args': content_args, 'body': None,
+            'attachment_name': None, 'attachment_path': None,
+            'status': STATUS_SENDING, 'attempts': 0, 'last_error': '',
+        }
+        if attachment is not None:
+            # La pièce jointe est copiée sur disque : l'objet uploadé disparaît avec le rerun
+            job['attachment_name'] = attachment.name
+            job['attachment_path'] = os.path.join(self.directory, f"{job_id}.bin")
+            with open(job['attachment_path'], 'wb') as f:
+                f.write(attachment.getvalue())
+        with self.lock:
+            self.jobs[job_id] = job
+            self._write()
+        self.executor.submit(self._process, job_id)
+        return job_id
+
+    def retry(self, job_id):
+        self._update(job_id, status=STATUS_SENDING, attempts=0, last_error='')
+        self.executor.submit(self._process, job_id)
+
+    def recent(self, kind=None, limit=10):
+        with self.lock:
+            jobs = [dict(j) for j in self.jobs.values() if kind is None or j['kind'] == kind]
+        return sorted(jobs, key=lambda j: j['created_at'], reverse=True)[:limit]
+
+    def _attachment(self, job):
+        if not job['attachment_path'] or not os.path.exists(job['attachment_path']):
+            return None
+        with open(job['attachment_path'], 'rb') as f:
+            attachment = io.BytesIO(f.read())
+        attachment.name = job['attachment_name']
+        return attachment
+
+    def _process(self, job_id):
+        job = self._update(job_id)
+        while job['attempts'] < OUTBOX_MAX_ATTEMPTS:
+            job = self._update(job_id, attempts=job['attempts'] + 1)
+            try:
+                # Le texte est généré une seule fois puis réutilisé par les reprises
+                if not job['body']:
+                    job = self._update(job_id, body=generate_ai_content(**job['content_args']))
+                success, msg = send_actual_email(job['recipients'], job['subject'], job['body'], self._attachment(job))
+            except Exception as e:
+                success, msg = False, str(e)
+            if success:
+                self._update(job_id, status=STATUS_SENT, last_error='',
+                             sent_at=datetime.now().isoformat(timespec='seconds'))
+                if job['attachment_path'] and os.path.exists(job['attachment_path']):
+                    os.remove(job['attachment_path'])
+                return
+            job = self._update(job_id, last_error=msg)
+            if job['attempts'] < OUTBOX_MAX_ATTEMPTS:
+                time.sleep(OUTBOX_RETRY_DELAY * 2 ** (job['attempts'] - 1))
+        self._update(job_id, status=STATUS_FAILED)
+
+@st.cache_resource(show_spinner=False)
+def get_outbox():
+    return NotificationOutbox()
+
+@st.fragment(run_every=5)
+def render_outbox_status(kind):
+    """Suivi des derniers envois (rafraîchi toutes les 5 secondes)."""
+    jobs = get_outbox().recent(kind)
+    if not jobs:
+        return
+    st.caption("📨 Derniers envois")
+    for job in jobs:
+        c1, c2 = st.columns([5, 1])
+        line = f"{STATUS_ICONS[job['status']]} {job['created_at'].replace('T', ' ')} — {job['label']} : **{job['status']}**"
+        if job['status'] == STATUS_FAILED and job['last_error']:
+            line += f" ({job['last_error']})"
+        c1.markdown(line)
+        if job['status'] == STATUS_FAILED and c2.button("Réessayer", key=f"retry_{job['id']}"):
+            get_outbox().retry(job['id'])
+            st.rerun(scope="fragment")
+
+# --- RELANCES PDC ---
+RELANCE_INTERVAL_DAYS = 3   # délai entre deux relances (secrets : [app] relance_interval_days)
+RELANCE_MAX = 5             # nombre maximal de relances par BL (secrets : [app] relance_max)
+
+def select_pdc_due(df_pdc, today=None, interval_days=RELANCE_INTERVAL_DAYS, max_relances=RELANCE_MAX):
+    """
+    Lignes PDC à relancer (onglet dans l'ordre de la feuille) : dernière relance
+    (ou réception) plus vieille que interval_days et moins de max_relances envois.
+    Ajoute la colonne 'sheet_row' (numéro de ligne dans la feuille).
+    """
+    if df_pdc.empty:
+        return df_pdc.assign(sheet_row=pd.Series(dtype='int64'))
+    today = pd.Timestamp(today or datetime.now().date())
+    df = df_pdc.assign(sheet_row=np.arange(2, len(df_pdc) + 2))
+    last = pd.to_datetime(df['date relance'], errors='coerce', format='%Y-%m-%d')
+    last = last.fillna(pd.to_datetime(df['DateReceptionPhysique'], errors='coerce', format='%Y-%m-%d'))
+    count = pd.to_numeric(df['Nombre de relance'], errors='coerce').fillna(0).astype(int)
+    due = (last.isna() | (last <= today - pd.Timedelta(days=interval_days))) & (count < max_relances)
+    due &= df['mail acheteur'].astype(str).str.contains('@')
+    return df[due].assign(**{'Nombre de relance': count[due]})
+
+def build_relance_digest(acheteur, rows):
+    """Sujet et corps du mail récapitulatif envoyé à un acheteur."""
+    lines = [
+        f"- BL {r['NuméroBL']} — {r['Fournisseur']} — reçu le {r['DateReceptionPhysique']} (relance n°{r['Nombre de relance'] + 1})"
+        for r in rows.to_dict('records')
+    ]
+    body = (
+        f"Bonjour {acheteur},\n\n"
+        f"Pour rappel, les réceptions suivantes sont toujours sans commande dans NOZYMAG :\n\n"
+        + "\n".join(lines)
+        + "\n\nPouvez-vous me donner des indications ?\n\nCordialement,\nService Logistique"
+    )
+    return f"RELANCE PDC - {len(rows)} BL en attente", body
+
+def run_pdc_relances(today=None):
+    """
+    Relance groupée : un mail par acheteur (une seule session SMTP), puis mise à
+    jour de 'date relance' et 'Nombre de relance' des lignes envoyées en un seul
+    batch_update (mis en file en cas d'indisponibilité, voir _send_diff).
+    Retourne [(acheteur, mail, nb BL, succès, détail)].
+    """
+    df_pdc = _get_worksheet_frame(WS_PDC)
+    # Colonnes à mettre à jour vérifiées avant tout envoi : sinon les mêmes acheteurs
+    # seraient relancés à nouveau au passage suivant
+    positions = df_pdc.attrs.get('positions', {})
+    missing = [c for c in ('date relance', 'Nombre de relance') if c not in positions]
+    if missing:
+        st.error(f"❌ Relances annulées : colonne(s) absente(s) de l'onglet {WS_PDC} : {', '.join(missing)}")
+        return []
+    due = select_pdc_due(
+        df_pdc.reindex(columns=COLUMNS_PDC, fill_value=''), today,
+        get_setting("relance_interval_days", RELANCE_INTERVAL_DAYS), get_setting("relance_max", RELANCE_MAX)
+    )
+    if due.empty:
+        return []
+    
+    groups = list(due.groupby(due['mail acheteur'].str.strip().str.lower(), sort=True))
+    emails = []
+    for mail, rows in groups:
+        subject, body = build_relance_digest(rows['Acheteur'].iloc[0], rows)
+        emails.append(([mail], subject, body, None))
+    results = send_batch_emails(emails)
+    
+    date_col = positions['date relance'] + 1
+    count_col = positions['Nombre de relance'] + 1
+    today_str = str(pd.Timestamp(today or datetime.now().date()).date())
+    updates = []
+    for (mail, rows), (success, _) in zip(groups, results):
+        if not success:
+            continue
+        for sheet_row, count in zip(rows['sheet_row'], rows['Nombre de relance']):
+            updates.append({'range': gspread.utils.rowcol_to_a1(sheet_row, date_col), 'values': [[today_str]]})
+            updates.append({'range': gspread.utils.rowcol_to_a1(sheet_row, count_col), 'values': [[int(count) + 1]]})
+    if updates:
+        # Mails déjà partis : la mise à jour est mise en file si Google Sheets est indisponible,
+        # et une autre erreur n'efface pas le compte rendu des envois
+        try:
+            _send_diff(WS_PDC, updates, priority=PRIORITY_BACKGROUND)
+        except Exception as e:
+            st.error(f"❌ Relances envoyées mais dates de relance non enregistrées : {e}")
+    
+    return [
+        (rows['Acheteur'].iloc[0], mail, len(rows), success, detail)
+        for (mail, rows), (success, detail) in zip(groups, results)
+    ]
+
 # --- APPLICATION ------------------------------------------------------------------------------------------------------------------------------
+# Registre des pages : libellé du menu, module du dossier vues/ (importé seulement
+# à la première visite) et onglets utilisés par la page (motifs acceptés : 'ARCHIVE_*').
+Page = namedtuple('Page', ['label', 'module', 'sheets'])
+PAGES = {
+    'dashboard': Page("📊 Tableau de Bord", 'vues.dashboard', [WS_DATA]),
+    'debug': Page("🔍 Vérifier la connexion GSheet", 'vues.debug', [WS_DATA, WS_REFUS, WS_TRANSPORT, WS_PDC]),
+    'refus': Page("🚚 Refus de marchandise ⚠️", 'vues.refus', [WS_REFUS, WS_MAILS]),
+    'transport': Page("🚚 Suivi Transport", 'vues.transport', [WS_TRANSPORT]),
+    'pdc': Page("⚠️ Pas de Commande", 'vues.pdc', [WS_PDC, WS_MAILS]),
+    'relance': Page("🔔 Relances PDC", 'vues.relance', [WS_PDC]),
+    'import': Page("📥 Import Excel", 'vues.import_excel', [WS_DATA]),
+    'emplacements': Page("📍 Emplacements", 'vues.emplacements', [WS_DATA]),
+    'deballage': Page("⚙️ Déballage", 'vues.deballage', [WS_DATA]),
+    'litige': Page("⚙️ Litiges", 'vues.litige', [WS_DATA]),
+    'hist': Page("📜 Historique Global", 'vues.hist', [WS_DATA, ARCHIVE_PREFIX + '*']),
+}
+
+class PageData:
+    """
+    Accès paresseux aux onglets déclarés par une page : un onglet n'est chargé
+    (load_data) qu'au premier get, puis réutilisé pendant le rerun. Les pages
+    qui n'utilisent pas DATA ne le lisent donc jamais.
+    """
+    def __init__(self, sheets):
+        self.sheets = set(sheets)
+        self._frames = {}
+
+    def get(self, ws_name, cols, typed=False, where=None, limit=None):
+        if not any(fnmatch.fnmatchcase(ws_name, pattern) for pattern in self.sheets):
+            raise KeyError(f"Onglet {ws_name} non déclaré pour cette page (voir PAGES)")
+        key = (ws_name, tuple(cols), typed, _where_key(where), limit)
+        if key not in self._frames:
+            self._frames[key] = load_data(ws_name, cols, typed, where, limit)
+        return self._frames[key]
+
 
 def main():
     st.set_page_config(page_title="Logistique Réception", layout="wide", page_icon="📦")
@@ -321,466 +2668,41 @@ def main():
     """, unsafe_allow_html=True)
     
     if 'page' not in st.session_state: st.session_state.page = 'dashboard'
+    
+    # Runs de la session, consultables sur la page de diagnostic
+    current_run = get_tracer().current_run()
+    if current_run:
+        session_runs = st.session_state.setdefault('trace_runs', [])
+        session_runs.append(current_run)
+        del session_runs[:-20]
 
  # Menu latéral
     with st.sidebar:
         st.title("📦 Logistique")
         st.info(f"Connecté au Sheet : {WS_DATA}")
         
-        pages = {
-            'dashboard': "📊 Tableau de Bord",
-			'debug': "🔍 Vérifier la connexion GSheet",
-            'refus': "🚚 Refus de marchandise ⚠️",
-            'transport': "🚚 Suivi Transport",
-            'pdc': "⚠️ Pas de Commande",
-            'import': "📥 Import Excel",
-            'emplacements': "📍 Emplacements",
-            'deballage': "⚙️ Déballage",
-            'litige': "⚙️ Litiges",
-            'hist': "📜 Historique Global"
-        }
-        
-        for key, label in pages.items():
-            if st.button(label, use_container_width=True, type="primary" if st.session_state.page == key else "secondary"):
+        for key, entry in PAGES.items():
+            if st.button(entry.label, use_container_width=True, type="primary" if st.session_state.page == key else "secondary"):
                 st.session_state.page = key
         
         st.divider()
+        mirror = get_mirror()
+        last_sync = mirror.last_sync()
+        if last_sync:
+            st.caption(f"🗄️ Copie locale synchronisée il y a {int(time.time() - last_sync)} s")
+        st.caption(f"📤 File d'écriture : {mirror.pending_count()} en attente")
+        failed = mirror.failed_count()
+        if failed:
+            st.warning(f"⚠️ {failed} écriture(s) non enregistrée(s) dans Google Sheets : voir la page de diagnostic.")
         if st.button("🔄 Actualiser les données"):
+            mirror.mark_stale()
+            invalidate_data_cache()
             st.rerun()
             
-    # Chargement initial des données
-    df_all = load_data(WS_DATA,COLUMNS_DATA)
-
-    # --- PAGE ACCUEIL 
-    if st.session_state.page == 'dashboard':
-        st.header("📊 Tableau de Bord Réception")
-        col1, col2, col3, col4 = st.columns(4)
-        col1.metric("Total Réceptions", len(df_all))
-        col2.metric("À déballer", len(df_all[df_all['StatutBL'] == 'À déballer']))
-        col3.metric("Litiges", len(df_all[df_all['StatutBL'] == 'LITIGE']))
-        col4.metric("Terminées", len(df_all[df_all['StatutBL'].isin(['TERMINEE', 'Clôturé'])]))
-        
-        st.subheader("Dernières réceptions")
-        st.dataframe(df_all.head(10), use_container_width=True)
-    
-	# --- PAGE REFUS DE MARCHANDISE---
-    # --- Lié à la page REFUS  ---
-    elif st.session_state.page == 'refus':
-        st.title("🚚 Déclaration de Refus")
-        
-        # Pré-chargement des contacts
-        contacts_map = load_mail_list_v2()
-        liste_labels = list(contacts_map.keys())
-        
-        with st.form("main_form_refus", clear_on_submit=True):
-            st.subheader("Détails de la livraison")
-            col1, col2 = st.columns(2)
-            with col1:
-                f_magasin = st.selectbox("Magasin", ["BAYONNE", "BIDART", "URRUGNE", "PMI"])
-                f_date = st.date_input("Date du refus", datetime.now())
-            with col2:
-                f_fourn = st.text_input("Fournisseur")
-                f_bl = st.text_input("Numéro de BL")
-            
-            st.divider()
-            
-            # Gestion des mails
-            f_emails_choisis = []
-            if not liste_labels:
-                st.warning("⚠️ Aucun contact trouvé dans 'MAIL'.")
-                f_manual = st.text_input("Saisir emails manuels (séparés par virgule) :")
-                f_emails_choisis = [e.strip() for e in f_manual.split(",") if "@" in e]
-            else:
-                selection = st.multiselect(
-                    "Destinataires :",
-                    options=liste_labels,
-                    help="Sélectionnez les noms ou tapez un mail + Entrée."
-                )
-                for item in selection:
-                    if item in contacts_map:
-                        f_emails_choisis.append(contacts_map[item])
-                    elif "@" in item:
-                        f_emails_choisis.append(item.strip())
-            
-            f_comment = st.text_area("Commentaire / Motif")
-            f_file = st.file_uploader("Preuve / Photo", type=["jpg", "png", "pdf"])
-            
-            # Bouton de validation (OBLIGATOIRE DANS LE FORM)
-            submit = st.form_submit_button("🚀 Enregistrer et Envoyer")
-            
-            if submit:
-                if f_fourn and f_bl and f_emails_choisis:
-                    with st.spinner("Traitement logistique..."):
-                        row = [f_magasin, str(f_date), f_fourn, f_bl, f_comment]
-                        if add_row_gsheet(WS_REFUS, row):
-                            contenu_mail = generate_ai_content(f_magasin, f_fourn, f_bl, f_comment, mode="refus")
-                            success, msg_mail = send_actual_email(f_emails_choisis, f"REFUS MARCHANDISE : {f_fourn}", contenu_mail, f_file)
-                            if success:
-  
-                                st.balloons()						
-                                st.success(f"✅ Refus enregistré et mail envoyé.")
-                                st.toast("Remise à zéro du formulaire...", icon="🔄")
-
-                            else:
-                                st.error(f"❌ GSheet OK mais erreur mail : {msg}")
-                        else:
-                            st.error("❌ Erreur lors de l'enregistrement GSheet.")
-                else:
-                    st.error("⚠️ Veuillez remplir le Fournisseur, le BL et au moins un destinataire.")
-
-        # Affichage de l'historique
-        st.divider()
-        st.subheader("📜 Historique des refus")
-        st.info("💡 Utilisez les cases vides sous les titres de colonnes pour filtrer.")
-        df_refus = load_data(WS_REFUS, COLUMNS_REFUS)        
-        if not df_refus.empty:
-            # Extraction EXCEL rapide
-            excel_data = to_excel(df_refus)
-            st.download_button(
-                label="📥 Extraire les données (EXCEL)",
-                data=excel_data,
-                file_name=f'refus_logistique_{datetime.now().strftime("%Y%m%d")}.xlsx',
-                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            )
-            grid_options = get_standard_grid_options(df_refus)
-            
-            # --- 2. EMPLACEMENT UTILISATION ---
-            AgGrid(
-                df_refus, 
-                gridOptions=grid_options, 
-                theme='balham',
-                height=600, 
-                width='100%',
-                update_mode=GridUpdateMode.VALUE_CHANGED,
-                data_return_mode=DataReturnMode.FILTERED_AND_SORTED,
-                allow_unsafe_jscode=True
-            )
-        else:
-            st.info("Aucun refus enregistré.")
-
-    # --- PAGE 2 : SUIVI TRANSPORT ---
-    # --- Lié à la page TRANSPORT  ---
-    elif st.session_state.page == 'transport':
-        st.title("🚛 Arrivée d'un transporteur")
-        
-        # Chargement historique pour calcul de l'ID auto
-        df_transp = load_data(WS_TRANSPORT, COLUMNS_TRANSPORT)
-        next_id = len(df_transp) + 1
-        
-        with st.form("form_transport", clear_on_submit=True):
-            st.subheader(f"Saisie Transport n°{next_id}")
-            c1, c2 = st.columns(2)
-            with c1:
-                t_magasin = st.selectbox("Magasin", ["BAYONNE", "BIDART", "URRUGNE", "PMI"], key="t_mag")
-                t_nom = st.text_input("Nom du Transporteur")
-                t_palettes = st.number_input("Nombre de palettes", min_value=0, step=1)
-            with c2:
-                t_poids = st.number_input("Poids total (kg)", min_value=0.0, step=0.5)
-                t_abime = st.selectbox("Colis abîmé ou ouvert ?", ["NON", "OUI"])
-                t_litige = st.selectbox("Litige à la réception ?", ["NON", "OUI"])
-            
-            t_comment = st.text_area("Commentaire Livraison")
-            
-            submit_t = st.form_submit_button("🏁 Valider l'arrivée")
-            
-            if submit_t:
-                if t_nom:
-                    with st.spinner("Enregistrement transporteur..."):
-                        row_t = [next_id, t_magasin, t_nom, t_palettes, t_poids, t_comment, t_abime, t_litige]
-                        if add_row_gsheet(WS_TRANSPORT, row_t):
-                            st.balloons()							
-                            st.success(f"✅ Transport n°{next_id} enregistré !")
-                            st.rerun()
-
-                        else:
-                            st.error("❌ Erreur lors de l'enregistrement.")
-                else:
-                    st.error("⚠️ Veuillez saisir le nom du transporteur.")					
-
-        st.divider()
-        st.subheader("📜 Historique des Transports")
-        
-        # Chargement propre des données pour l'historique
-        df_historique = load_data(WS_TRANSPORT, COLUMNS_TRANSPORT)
-
-        if not df_historique.empty:
-            AgGrid(df_historique, gridOptions=get_standard_grid_options(df_historique), height=400, theme='balham', key="grid_t_page_final")
-        else:
-            st.info("Aucun transport dans l'historique.")
-
-    elif st.session_state.page == 'debug':
-        st.title("🔍 Diagnostic de Connexion")
-        try:
-            gc = authenticate_gsheet()
-            sh = gc.open_by_key(SHEET_ID)
-            st.success(f"✅ Connecté au Google Sheet : {sh.title}")
-            
-            onglets = [w.title for w in sh.worksheets()]
-            st.write(f"Onglets trouvés : {onglets}")
-            
-            if WS_TRANSPORT in onglets:
-                ws = sh.worksheet(WS_TRANSPORT)
-                header = ws.row_values(1)
-                st.write(f"✅ Onglet '{WS_TRANSPORT}' trouvé.")
-                st.write(f"Colonnes actuelles dans GSheet : {header}")
-                st.write(f"Colonnes attendues par Python : {COLUMNS_TRANSPORT}")
-                
-                test_data = ws.get_all_records()
-                st.write(f"Nombre de lignes de données : {len(test_data)}")
-                if test_data:
-                    st.json(test_data[0])
-            else:
-                st.error(f"❌ L'onglet '{WS_TRANSPORT}' est introuvable !")
-                if st.button("Créer l'onglet TRANSPORT"):
-                    sh.add_worksheet(title=WS_TRANSPORT, rows="100", cols="20")
-                    sh.worksheet(WS_TRANSPORT).append_row(COLUMNS_TRANSPORT)
-                    st.rerun()
-        except Exception as e:
-            st.error(f"Erreur de diagnostic : {e}")
-			
-    # --- PAGE 3 : PAS DE COMMANDE ---
-    # --- Lié à la page PDC  ---
-    elif st.session_state.page == 'pdc':
-        st.title("📦 PDC - Pas De Commande")
-        contacts_map = load_mail_list_v2()
-        liste_labels = list(contacts_map.keys())
-        
-        with st.form("form_pdc", clear_on_submit=True):
-            st.subheader("Signaler une réception sans commande")
-            c1, c2 = st.columns(2)
-            with c1:
-                p_fourn = st.text_input("Fournisseur")
-                p_bl = st.text_input("Numéro du BL")
-                p_date = st.date_input("Date Réception Physique", datetime.now())
-            with c2:
-                p_label_acheteur = st.selectbox("Acheteur", options=[""] + liste_labels)
-                p_comment = st.text_area("Commentaire (optionnel)", help="Précisions pour l'acheteur")
-            
-            st.divider()
-            st.info("ℹ️ La pièce jointe est obligatoire pour signaler un PDC.")
-            p_file = st.file_uploader("Joindre le BL (Obligatoire)", type=["jpg", "png", "pdf", "xlsx"])
-            
-            submit_pdc = st.form_submit_button("📧 Envoyer l'alerte PDC")
-            
-            if submit_pdc:
-                if not p_file:
-                    st.error("⚠️ Vous devez obligatoirement joindre une pièce jointe (scan du BL).")
-                elif p_fourn and p_bl and p_label_acheteur:
-                    with st.spinner("Traitement du PDC..."):
-                        mail_acheteur = contacts_map[p_label_acheteur]
-                        nom_acheteur = p_label_acheteur.split(" (")[0]
-                        
-                        # Ajout GSheet : Fournisseur, NuméroBL, Commentaire_PDC , Date, Acheteur, mail, date_relance, nb_relance
-                        row_pdc = [p_fourn, p_bl, str(p_date), p_comment, nom_acheteur, mail_acheteur, str(datetime.now().date()), 0]
-                        
-                        if add_row_gsheet(WS_PDC, row_pdc):
-                            contenu = generate_ai_content("", p_fourn, p_bl, p_comment, mode="pdc")
-                            success, msg = send_actual_email([mail_acheteur], f"PDC - BL {p_bl} - {p_fourn}", contenu, p_file)
-                            if success:
-                                st.success("✅ Alerte PDC envoyée à l'acheteur.")
-                                st.balloons()
-                                #st.rerun()
-                            else:
-                                st.warning(f"✅ Enregistré mais erreur mail : {msg}")
-                else:
-                    st.error("⚠️ Veuillez remplir le fournisseur, le BL et l'acheteur.")
-
-        st.divider()
-        st.subheader("📋 Historique PDC")
-        df_pdc = load_data(WS_PDC, COLUMNS_PDC)
-        if not df_pdc.empty:
-            AgGrid(df_pdc, gridOptions=get_standard_grid_options(df_pdc), height=400, theme='balham', key="grid_pdc")
-
-    # ---  IMPORT EXCEL ---
-# --- Lié à la page DATA  ---
-    elif st.session_state.page == 'import':
-        st.title("📥 Import des nouvelles réceptions")
-        st.info("Mode : **Ajouter à la suite**. Contrôle des doublons activé sur le champ `NumReception`.")
-        
-        with st.expander("📝 Détails de l'importation"):
-            st.write("Le système applique les règles suivantes :")
-            st.markdown("- **Contrôle Doublon** : Interdiction d'importer un numéro déjà existant.")
-            st.markdown("- **Correspondance automatique** : La colonne `N°` devient `NumReception`.")
-            st.markdown("- **Statut automatique** : Chaque ligne est marquée comme `À déballer`.")
-            st.markdown("- **Champs vides** : Les colonnes Emplacement, Déballage et Litiges sont initialisées vides.")
-        
-        uploaded_file = st.file_uploader("Choisir un fichier Excel", type=['xlsx', 'xls'])
-        
-        if uploaded_file:
-            try:
-                df_upload = pd.read_excel(uploaded_file)
-                st.write(f"🔍 Aperçu du fichier chargé ({len(df_upload)} lignes) :")
-                st.dataframe(df_upload.head())
-                
-                # 1. Application du mappage des colonnes
-                df_mapped = df_upload.rename(columns=COLUMN_MAPPING)
-                
-                # 2. Préparation du DataFrame final avec toutes les colonnes cibles
-                df_to_process = df_mapped.reindex(columns=COLUMNS_DATA)
-                
-                # 3. Application des valeurs par défaut demandées
-                df_to_process['StatutBL'] = "À déballer"
-                
-                # Initialisation explicite à vide pour les champs gérés plus tard
-                cols_to_init = ['Emplacement', 'NomDeballage', 'DateClotureDeballage', 'LitigesCompta', 'Commentaire_litige', 'NumTransport']
-                for c in cols_to_init:
-                    df_to_process[c] = ""
-                
-                if st.button("🚀 Lancer l'importation (Ajouter à la suite)"):
-                    with st.spinner("Vérification des doublons et fusion..."):
-                        # Charger les données actuelles pour vérification des doublons
-                        df_current = load_data(WS_DATA, COLUMNS_DATA)
-                        
-                        # Liste des NumReception déjà présents
-                        existing_nums = set(df_current['NumReception'].astype(str).unique())
-                        # Liste des nouveaux NumReception à importer
-                        new_nums = df_to_process['NumReception'].astype(str).tolist()
-                        
-                        # Identification des doublons
-                        doubles = [n for n in new_nums if n in existing_nums and n != "" and n != "nan"]
-                        
-                        if doubles:
-                            st.error(f"❌ Importation annulée : {len(doubles)} numéro(s) de réception existe(nt) déjà dans la base.")
-                            st.warning(f"Numéros en doublon : {', '.join(doubles[:15])}{'...' if len(doubles) > 15 else ''}")
-                        else:
-                            # Concaténation (Ajouter à la suite)
-                            df_final = pd.concat([df_current, df_to_process], ignore_index=True).fillna('')
-                            
-                            # Appel de la fonction de sauvegarde
-                            if save_data_to_gsheet(WS_DATA, df_final):
-                                st.success(f"✅ Importation réussie ! {len(df_to_process)} nouvelles lignes ajoutées.")
-                                st.balloons()
-                                # Forcer le rafraîchissement
-                                st.session_state['last_import_time'] = datetime.now()
-                            else:
-                                st.error("❌ Échec de la sauvegarde sur Google Sheets.")
-            except Exception as e:
-                st.error(f"❌ Erreur lors du traitement : {e}")
-        
-        # Section Historique
-        st.divider()
-        st.subheader("📋 Historique des réceptions (Base DATA)")
-        with st.spinner("Chargement de l'historique..."):
-            df_history = load_data(WS_DATA, COLUMNS_DATA)
-            if not df_history.empty:
-                AgGrid(
-                    df_history.iloc[::-1], 
-                    gridOptions=get_standard_grid_options(df_history), 
-                    height=500, 
-                    theme='balham',
-                    update_mode=GridUpdateMode.NO_UPDATE
-                )
-            else:
-                st.info("Aucune donnée dans la base DATA.")
-
-    # --- EMPLACEMENTS ---
-    # --- Lié à la page DATA  ---
-    elif st.session_state.page == 'emplacements':
-        st.title("📍 Attribution des Emplacements")
-        st.write("Double-cliquez dans la colonne **Emplacement** pour saisir manuellement, puis cliquez sur le bouton de sauvegarde.")
-        
-        df_data = load_data(WS_DATA, COLUMNS_DATA)
-        # On ne montre que ce qui est "À déballer"
-        df_to_show = df_data[df_data['StatutBL'] == "À déballer"].copy()
-        
-        if df_to_show.empty:
-            st.info("Aucun bon de livraison en attente de déballage.")
-        else:
-            gb = GridOptionsBuilder.from_dataframe(df_to_show)
-            gb.configure_default_column(resizable=True, sortable=True, filter=True)
-            
-            # CONFIGURATION : Rendre la colonne Emplacement éditable manuellement
-            gb.configure_column("Emplacement", editable=True, cellStyle={'background-color': '#e1f5fe'})
-            
-            # On empêche l'édition des autres colonnes importantes pour la sécurité
-            for col in df_to_show.columns:
-                if col != "Emplacement":
-                    gb.configure_column(col, editable=False)
-            
-            grid_opts = gb.build()
-            
-            # Affichage du tableau éditable
-            grid_res = AgGrid(
-                df_to_show, 
-                gridOptions=grid_opts, 
-                height=500, 
-                theme='balham',
-                update_mode=GridUpdateMode.VALUE_CHANGED | GridUpdateMode.MANUAL,
-                data_return_mode=DataReturnMode.FILTERED_AND_SORTED
-            )
-            
-            # Bouton de sauvegarde global
-            if st.button("💾 Sauvegarder les emplacements saisis", use_container_width=True, type="primary"):
-                df_updated_view = pd.DataFrame(grid_res['data'])
-                
-                if not df_updated_view.empty:
-                    # On fusionne les changements de la vue vers le DataFrame principal
-                    # On utilise NumReception comme clé de réconciliation
-                    for index, row in df_updated_view.iterrows():
-                        num_rec = str(row['NumReception'])
-                        nouvel_emp = str(row['Emplacement'])
-                        df_data.loc[df_data['NumReception'].astype(str) == num_rec, 'Emplacement'] = nouvel_emp
-                    
-                    with st.spinner("Mise à jour de la base de données..."):
-                        if save_data_to_gsheet(WS_DATA, df_data):
-                            st.success("✅ Tous les emplacements ont été enregistrés avec succès !")
-                            st.rerun()
-                        else:
-                            st.error("❌ Erreur lors de la sauvegarde sur Google Sheets.")
-
-    # --- DÉBALLAGE ---
-    # --- Lié à la page DATA  ---
-    elif st.session_state.page == 'deballage':
-        st.header("⚙️ Suivi du Déballage ")
-        # Filtrer pour ne pas montrer ce qui est déjà fini depuis longtemps si nécessaire
-        df_target = df_all[df_all['StatutBL'] != 'TERMINEE'].copy()
-        
-        grid_res = render_custom_grid(
-            df_target[['NumReception', 'Fournisseur', 'StatutBL', 'NomDeballage', 'LitigesCompta', 'Commentaire_litige']],
-            editable_cols=['StatutBL', 'NomDeballage', 'LitigesCompta', 'Commentaire_litige'],
-            status_options=['À déballer', 'EN COURS', 'TERMINEE', 'LITIGE', 'A_DEBALLER']
-        )
-        
-        if st.button("💾 Enregistrer les modifications de déballage"):
-            df_updated = df_all.copy()
-            updated_rows = pd.DataFrame(grid_res['data'])
-            for _, row in updated_rows.iterrows():
-                for col in ['StatutBL', 'NomDeballage', 'LitigesCompta', 'Commentaire_litige']:
-                    df_updated.loc[df_updated['NumReception'] == row['NumReception'], col] = row[col]
-            
-            if save_data_to_gsheet(df_updated):
-                st.success("Mise à jour effectuée !")
-                st.rerun()
-                
-    # --- PAGE 7 : LITIGES ---
-    # --- Lié à la page LITIGES  ---
-    elif st.session_state.page == 'litige':
-        st.header("⚙️ Suivi des Litiges")
-        # Filtrer pour ne pas montrer ce qui est déjà fini depuis longtemps si nécessaire
-        df_target = df_all[df_all['StatutBL'] != 'TERMINEE'].copy()
-        
-        grid_res = render_custom_grid(
-            df_target[['NumReception', 'Fournisseur', 'StatutBL', 'NomDeballage', 'LitigesCompta', 'Commentaire_litige']],
-            editable_cols=['StatutBL', 'NomDeballage', 'LitigesCompta', 'Commentaire_litige'],
-            status_options=['À déballer', 'EN COURS', 'TERMINEE', 'LITIGE', 'A_DEBALLER']
-        )
-        
-        if st.button("💾 Enregistrer les modifications de déballage"):
-            df_updated = df_all.copy()
-            updated_rows = pd.DataFrame(grid_res['data'])
-            for _, row in updated_rows.iterrows():
-                for col in ['StatutBL', 'NomDeballage', 'LitigesCompta', 'Commentaire_litige']:
-                    df_updated.loc[df_updated['NumReception'] == row['NumReception'], col] = row[col]
-            
-            if save_data_to_gsheet(df_updated):
-                st.success("Mise à jour effectuée !")
-                st.rerun()
-    
-    # --- PAGE HISTORIQUE---    
-    # --- Lié à la page DATA  ---
-    elif st.session_state.page == 'hist':
-        st.header("📜 Historique Complet")
-        render_custom_grid(df_all)
+    # Page demandée : module importé à la première visite, onglets lus au premier accès
+    page = PAGES.get(st.session_state.page, PAGES['dashboard'])
+    importlib.import_module(page.module).render(sys.modules[__name__], PageData(page.sheets))
 
 if __name__ == "__main__":
-    main()
+    with get_tracer().run(st.session_state.get('page', 'dashboard')):
+        main()
@@ -0,0 +1,42 @@
+"""
+normalize_import_chunk : normalisation d'un paquet Excel vers les colonnes de DATA.
+
+Lancement (depuis la racine du dépôt) :
+    python -m pytest -q tests
+"""
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import streamlit_app as app  # noqa: E402
+
+EXCEL_COLUMN = {data_col: excel_col for excel_col, data_col in app.COLUMN_MAPPING.items()}
+
+
+def _chunk(column, values):
+    """Paquet Excel : numéros de réception 1..n et valeurs de la colonne DATA column."""
+    chunk = pd.DataFrame({excel_col: [None] * len(values) for excel_col in app.COLUMN_MAPPING})
+    chunk[EXCEL_COLUMN['NumReception']] = pd.Series([str(i + 1) for i in range(len(values))], dtype=object)
+    chunk[EXCEL_COLUMN[column]] = pd.Series(values, dtype=object)
+    return chunk
+
+
+def test_delivery_dates_iso_and_day_first():
+    values = ['2026-01-05', '2026-01-05 00:00:00', '2026-03-04', '05/01/2026', '04/03/26',
+              datetime(2026, 3, 4), 'pas une date', None]
+
+    out, reasons = app.normalize_import_chunk(_chunk('Livré le', values))
+
+    assert out['Livré le'].tolist() == ['2026-01-05', '2026-01-05', '2026-03-04', '2026-01-05', '2026-03-04',
+                                        '2026-03-04', 'pas une date', '']
+    assert reasons.tolist() == [''] * 6 + ["Date de livraison invalide", '']
+
+
+def test_reception_numbers_keep_text_cells():
+    out, reasons = app.normalize_import_chunk(_chunk('NumReception', ['00123', '1E5', 12345.0, 77, ' 42 ', None]))
+
+    assert out['NumReception'].tolist() == ['00123', '1E5', '12345', '77', '42', '']
+    assert reasons.tolist() == [''] * 5 + ["N° de réception manquant"]
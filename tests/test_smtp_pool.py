@@ -0,0 +1,161 @@
+"""
+SmtpPool / send_batch_emails contre un serveur SMTP local (aiosmtpd) :
+STARTTLS + login comme le serveur réel, sans envoi vers l'extérieur.
+
+Lancement (depuis la racine du dépôt) :
+    python -m pytest -q tests
+"""
+import datetime
+import os
+import socket
+import ssl
+import sys
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+x509 = pytest.importorskip("cryptography.x509")
+from aiosmtpd.controller import Controller  # noqa: E402
+from aiosmtpd.smtp import AuthResult  # noqa: E402
+from cryptography.hazmat.primitives import hashes, serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from cryptography.x509.oid import NameOID  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import streamlit_app as app  # noqa: E402
+
+LOGIN, PASSWORD = "magasin@example.com", "secret"
+REFUSED = "inconnu@example.com"
+
+
+class RecordingHandler:
+    """Garde les messages reçus ; refuse REFUSED ; peut couper la connexion au prochain DATA."""
+
+    def __init__(self):
+        self.messages = []
+        self.logins = 0
+        self.drop_next_data = False
+
+    def authenticate(self, server, session, envelope, mechanism, auth_data):
+        ok = auth_data.login.decode() == LOGIN and auth_data.password.decode() == PASSWORD
+        self.logins += ok
+        return AuthResult(success=ok)
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address == REFUSED:
+            return '550 5.1.1 Destinataire inconnu'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.drop_next_data:
+            self.drop_next_data = False
+            server.transport.close()
+            return '421 Connexion fermée'
+        self.messages.append(envelope.rcpt_tos[:])
+        return '250 Message accepted'
+
+
+def _self_signed_context(tmp_path):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    cert_path, key_path = tmp_path / "cert.pem", tmp_path / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                                           serialization.NoEncryption()))
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(tmp_path, monkeypatch):
+    handler = RecordingHandler()
+    port = _free_port()
+    context = _self_signed_context(tmp_path)
+
+    def start():
+        controller = Controller(handler, hostname='127.0.0.1', port=port, tls_context=context,
+                                require_starttls=True, authenticator=handler.authenticate, auth_require_tls=True)
+        controller.start()
+        return controller
+
+    monkeypatch.setattr(app.st, 'secrets', {'email': {
+        'smtp_server': '127.0.0.1', 'smtp_port': port, 'sender_email': LOGIN, 'sender_password': PASSWORD,
+    }})
+    pool = app.SmtpPool()
+    monkeypatch.setattr(app, 'get_smtp_pool', lambda: pool)
+    controllers = [start()]
+
+    def restart():
+        controllers[-1].stop()
+        controllers.append(start())
+
+    yield handler, pool, restart
+    pool.close_all()
+    controllers[-1].stop()
+
+
+def _emails(*recipients):
+    return [([dest], f"Relance {i}", f"Message {i}", None) for i, dest in enumerate(recipients)]
+
+
+def test_messages_share_one_session(smtp_server):
+    handler, pool, _ = smtp_server
+    dests = [f"acheteur{i}@example.com" for i in range(5)]
+
+    results = app.send_batch_emails(_emails(*dests))
+
+    assert results == [(True, "Succès")] * 5
+    assert handler.messages == [[d] for d in dests]
+    assert handler.logins == 1
+    # La session reste ouverte pour l'envoi suivant
+    app.send_batch_emails(_emails("suivant@example.com"))
+    assert handler.logins == 1
+
+
+def test_reconnects_when_server_drops_connection(smtp_server):
+    handler, pool, _ = smtp_server
+    handler.drop_next_data = True
+
+    results = app.send_batch_emails(_emails("a@example.com", "b@example.com"))
+
+    assert results == [(True, "Succès")] * 2
+    assert handler.messages == [["a@example.com"], ["b@example.com"]]
+    assert handler.logins == 2
+
+
+def test_reconnects_after_server_restart(smtp_server):
+    handler, pool, restart = smtp_server
+    app.send_batch_emails(_emails("a@example.com"))
+    # Connexion inactive coupée par le serveur : le NOOP échoue, une nouvelle session est ouverte
+    restart()
+
+    results = app.send_batch_emails(_emails("b@example.com"))
+
+    assert results == [(True, "Succès")]
+    assert handler.messages == [["a@example.com"], ["b@example.com"]]
+    assert handler.logins == 2
+
+
+def test_refused_recipient_fails_only_its_message(smtp_server):
+    handler, pool, _ = smtp_server
+
+    results = app.send_batch_emails(_emails("a@example.com", REFUSED, "c@example.com"))
+
+    assert results[0] == (True, "Succès")
+    assert results[1][0] is False and REFUSED in results[1][1]
+    assert results[2] == (True, "Succès")
+    assert handler.messages == [["a@example.com"], ["c@example.com"]]
+    assert handler.logins == 1
@@ -0,0 +1,9 @@
+"""
+Pages de l'application, importées à la demande (voir PAGES dans streamlit_app.py).
+
+Chaque module expose render(app, data) :
+  - app : le module streamlit_app en cours d'exécution (fonctions et constantes
+    partagées), transmis par main() plutôt qu'importé pour ne pas recharger le
+    script sous un second nom, avec ses propres caches ;
+  - data : PageData, accès paresseux aux onglets déclarés pour la page.
+"""
@@ -0,0 +1,37 @@
+"""Tableau de bord réception : indicateurs agrégés et dernières réceptions."""
+import streamlit as st
+
+
+def render(app, data):
+    # Seules les 10 lignes affichées en bas de page sont lues
+    df_recent = data.get(app.WS_DATA, app.COLUMNS_DATA, typed=True, limit=10)
+    st.header("📊 Tableau de Bord Réception")
+    # Indicateurs lus dans la table agrégée (pas de parcours de l'historique)
+    summary = app.dashboard_summary()
+    by_status = summary.groupby('StatutBL')['Nb'].sum()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Total Réceptions", int(summary['Nb'].sum()))
+    col2.metric("À déballer", int(by_status.get('À déballer', 0)))
+    col3.metric("Litiges", int(by_status.get('LITIGE', 0)))
+    col4.metric("Terminées", int(by_status.reindex(app.DONE_STATUSES).fillna(0).sum()))
+
+    if not summary.empty:
+        st.subheader("Volume de réceptions (90 derniers jours)")
+        volume = app.reception_volume(summary)
+        if not volume.empty:
+            st.line_chart(volume)
+        
+        c1, c2 = st.columns(2)
+        with c1:
+            st.subheader("Statuts par magasin")
+            st.dataframe(summary.pivot_table(index='Magasin', columns='StatutBL', values='Nb', aggfunc='sum', fill_value=0), use_container_width=True)
+        with c2:
+            st.subheader("Ancienneté « À déballer »")
+            ageing = app.ageing_to_unpack(summary)
+            if ageing.empty:
+                st.info("Aucune réception à déballer.")
+            else:
+                st.dataframe(ageing, use_container_width=True)
+
+    st.subheader("Dernières réceptions")
+    st.dataframe(df_recent, use_container_width=True)
@@ -0,0 +1,23 @@
+"""Suivi du déballage (statut, nom, litiges)."""
+import streamlit as st
+
+# Seules les colonnes du suivi sont lues dans l'onglet DATA
+COLUMNS = ['NumReception', 'Fournisseur', 'StatutBL', 'NomDeballage', 'LitigesCompta', 'Commentaire_litige']
+
+
+def render(app, data):
+    df_all = data.get(app.WS_DATA, COLUMNS, typed=True)
+    st.header("⚙️ Suivi du Déballage ")
+    # Filtrer pour ne pas montrer ce qui est déjà fini depuis longtemps si nécessaire
+    df_target = df_all[df_all['StatutBL'] != 'TERMINEE']
+
+    grid_res = app.render_custom_grid(
+        df_target,
+        editable_cols=['StatutBL', 'NomDeballage', 'LitigesCompta', 'Commentaire_litige'],
+        status_options=['À déballer', 'EN COURS', 'TERMINEE', 'LITIGE', 'A_DEBALLER']
+    )
+
+    if st.button("💾 Enregistrer les modifications de déballage"):
+        if app.save_grid_edits(app.WS_DATA, grid_res):
+            st.success("Mise à jour effectuée !")
+            st.rerun()
@@ -0,0 +1,114 @@
+"""Diagnostic : connexion Google Sheets, mémoire des DataFrames et traces."""
+import os
+import time
+import streamlit as st
+
+
+def render(app, data):
+    st.title("🔍 Diagnostic de Connexion")
+    try:
+        # Métadonnées en cache et lignes lues dans la copie locale : pas de lecture complète à chaque affichage
+        titre, onglets = app.get_spreadsheet_tabs()
+        st.success(f"✅ Connecté au Google Sheet : {titre}")
+        st.write(f"Onglets trouvés : {list(onglets)}")
+        
+        if app.WS_TRANSPORT in onglets:
+            header = app.get_mirror().header(app.WS_TRANSPORT)
+            st.write(f"✅ Onglet '{app.WS_TRANSPORT}' trouvé.")
+            st.write(f"Colonnes actuelles dans GSheet : {header}")
+            st.write(f"Colonnes attendues par Python : {app.COLUMNS_TRANSPORT}")
+            
+            test_data = app.load_data(app.WS_TRANSPORT, app.COLUMNS_TRANSPORT)
+            st.write(f"Nombre de lignes de données : {len(test_data)}")
+            if not test_data.empty:
+                st.json(test_data.iloc[0].to_dict())
+        else:
+            st.error(f"❌ L'onglet '{app.WS_TRANSPORT}' est introuvable !")
+            if st.button("Créer l'onglet TRANSPORT"):
+                app.create_worksheet(app.WS_TRANSPORT, app.COLUMNS_TRANSPORT)
+                st.rerun()
+    except Exception as e:
+        st.error(f"Erreur de diagnostic : {e}")
+
+    st.subheader("🧮 Mémoire des DataFrames (texte / typé)")
+    # Charge et type chaque onglet : calculé à la demande, pas à chaque affichage
+    if st.button("🧮 Mesurer la mémoire"):
+        st.session_state['debug_memory'] = app.frame_memory_report({
+            app.WS_DATA: app.COLUMNS_DATA, app.WS_REFUS: app.COLUMNS_REFUS,
+            app.WS_TRANSPORT: app.COLUMNS_TRANSPORT, app.WS_PDC: app.COLUMNS_PDC,
+        })
+    if 'debug_memory' in st.session_state:
+        st.dataframe(st.session_state['debug_memory'], hide_index=True)
+
+    with st.expander("⏱️ Traces d'exécution (durées, appels API)"):
+        tracer = app.get_tracer()
+        spans = tracer.frame()
+        previous_runs = [r for r in st.session_state.get('trace_runs', []) if r != tracer.current_run()]
+        reruns = spans[(spans['name'] == 'rerun') & spans['run'].isin(previous_runs)].iloc[::-1]
+        if reruns.empty:
+            st.info("Aucune mesure pour cette session : naviguez dans l'application puis revenez ici.")
+        else:
+            st.write("Derniers affichages de cette session :")
+            st.dataframe(reruns[['run', 'target', 'ms', 'api_calls']].rename(columns={'target': 'page'}), hide_index=True)
+            run = st.selectbox("Détail de l'affichage", reruns['run'].tolist(),
+                               format_func=lambda r: f"{r} — {reruns.loc[reruns['run'] == r, 'target'].iloc[0]}")
+            st.dataframe(spans[spans['run'] == run][['name', 'target', 'ms', 'api_calls', 'size', 'ok']], hide_index=True)
+        
+        recent_api = spans[(spans['name'] == 'sheets_api') & (spans['ts'] > time.time() - 3600)]
+        if not recent_api.empty:
+            st.write("Appels Google Sheets par onglet (dernière heure, toutes sessions et arrière-plan) :")
+            st.dataframe(recent_api.groupby('target').agg(appels=('api_calls', 'sum'), duree_ms=('ms', 'sum')))
+        if os.path.exists(app.TRACE_LOG_PATH):
+            with open(app.TRACE_LOG_PATH, 'rb') as f:
+                st.download_button("📄 Télécharger le journal des traces", f.read(), file_name="traces.jsonl")
+
+    mirror = app.get_mirror()
+    with st.expander(f"📤 Écritures non enregistrées ({mirror.failed_count()})"):
+        st.write("Écritures refusées par Google Sheets (erreur définitive ou "
+                 f"{app.WRITE_MAX_ATTEMPTS} échecs) : retirées de la file pour ne pas bloquer la synchronisation.")
+        failed = mirror.failed_writes()
+        if failed.empty:
+            st.info("Aucune écriture en échec.")
+        else:
+            st.dataframe(failed, hide_index=True)
+            selected = st.multiselect("Écritures", failed['id'].tolist(),
+                                      format_func=lambda i: f"n°{i} — {failed.loc[failed['id'] == i, 'onglet'].iloc[0]}")
+            c1, c2 = st.columns(2)
+            if c1.button("🔁 Renvoyer", disabled=not selected):
+                mirror.retry_failed(selected)
+                st.rerun()
+            if c2.button("🗑️ Abandonner", disabled=not selected):
+                mirror.discard_failed(selected)
+                st.rerun()
+
+    with st.expander("🚦 Ordonnanceur des appels Google Sheets"):
+        st.write(f"Débit autorisé : {app.get_setting('api_quota', app.API_QUOTA)} appels par {app.API_QUOTA_WINDOW} s "
+                 "pour tout le serveur (saisies, puis lectures des pages, puis synchro et relances).")
+        st.dataframe([app.get_api_scheduler().status()], hide_index=True)
+
+    with st.expander("🗄️ Archivage des réceptions clôturées"):
+        st.write("Les réceptions clôturées anciennes sont déplacées de DATA vers les onglets annuels "
+                 f"{app.ARCHIVE_PREFIX}<année>, consultables depuis l'Historique Global.")
+        min_age = st.number_input("Âge minimal (jours)", min_value=30, step=30,
+                                  value=app.get_setting("archive_after_days", app.ARCHIVE_AFTER_DAYS))
+        # Lecture complète de DATA : aperçu calculé à la demande, pour l'âge choisi
+        if st.button("🔎 Compter les réceptions archivables"):
+            try:
+                st.session_state['debug_archive'] = (min_age, app.archive_closed_receptions(min_age, dry_run=True))
+            except Exception as e:
+                st.session_state.pop('debug_archive', None)
+                st.error(f"❌ Calcul impossible : {e}")
+        previewed_age, preview = st.session_state.get('debug_archive', (None, None))
+        if preview is not None and previewed_age == min_age:
+            if not preview:
+                st.info("Aucune réception à archiver.")
+            else:
+                st.write(", ".join(f"{tab} : {n} ligne(s)" for tab, n in preview.items()))
+                if st.button("🗄️ Archiver maintenant", type="primary"):
+                    with st.spinner("Archivage en cours..."):
+                        try:
+                            moved = app.archive_closed_receptions(min_age)
+                            st.session_state.pop('debug_archive', None)
+                            st.success(f"✅ {sum(moved.values())} réception(s) archivée(s).")
+                        except Exception as e:
+                            st.error(f"❌ Archivage interrompu : {e}")
@@ -0,0 +1,50 @@
+"""Attribution des emplacements des réceptions à déballer."""
+import streamlit as st
+from st_aggrid import AgGrid, DataReturnMode, GridOptionsBuilder, GridUpdateMode
+
+
+def render(app, data):
+    st.title("📍 Attribution des Emplacements")
+    st.write("Double-cliquez dans la colonne **Emplacement** pour saisir manuellement, puis cliquez sur le bouton de sauvegarde.")
+
+    # On ne montre que ce qui est "À déballer" (filtre appliqué à la lecture)
+    df_data = data.get(app.WS_DATA, app.COLUMNS_DATA, where={'StatutBL': "À déballer"})
+    # Copie pour AgGrid, qui ajoute ses propres colonnes au DataFrame affiché
+    df_to_show = df_data.copy(deep=False)
+
+    if df_to_show.empty:
+        st.info("Aucun bon de livraison en attente de déballage.")
+    else:
+        gb = GridOptionsBuilder.from_dataframe(df_to_show)
+        gb.configure_default_column(resizable=True, sortable=True, filter=True)
+        
+        # CONFIGURATION : Rendre la colonne Emplacement éditable manuellement
+        gb.configure_column("Emplacement", editable=True, cellStyle={'background-color': '#e1f5fe'})
+        
+        # On empêche l'édition des autres colonnes importantes pour la sécurité
+        for col in df_to_show.columns:
+            if col != "Emplacement":
+                gb.configure_column(col, editable=False)
+        
+        # Le navigateur note les emplacements saisis : seules ces cellules sont renvoyées
+        grid_opts = app.track_cell_edits(gb.build())
+        
+        # Affichage du tableau éditable
+        grid_res = AgGrid(
+            df_to_show, 
+            gridOptions=grid_opts, 
+            height=500, 
+            theme='balham',
+            update_mode=GridUpdateMode.VALUE_CHANGED | GridUpdateMode.MANUAL,
+            data_return_mode=DataReturnMode.CUSTOM,
+            custom_jscode_for_grid_return=app.EDITS_RETURN_JS,
+            allow_unsafe_jscode=True
+        )
+        
+        # Bouton de sauvegarde global
+        if st.button("💾 Sauvegarder les emplacements saisis", use_container_width=True, type="primary"):
+            with st.spinner("Mise à jour de la base de données..."):
+                # Chaque cellule est comparée à la valeur chargée avant d'être écrite
+                if app.save_grid_edits(app.WS_DATA, grid_res):
+                    st.success("✅ Tous les emplacements ont été enregistrés avec succès !")
+                    st.rerun()
@@ -0,0 +1,18 @@
+"""Historique complet : onglet DATA et, à la demande, onglets d'archive annuels."""
+import pandas as pd
+import streamlit as st
+
+
+def render(app, data):
+    df_all = data.get(app.WS_DATA, app.COLUMNS_DATA, typed=True)
+    st.header("📜 Historique Complet")
+    try:
+        archives = app.list_archive_tabs()
+    except Exception as e:
+        archives = ()
+        st.warning(f"⚠️ Liste des archives indisponible : {e}")
+    # Les archives ne sont lues que si elles sont demandées
+    selected = st.multiselect("Inclure les réceptions archivées", archives, format_func=lambda tab: tab[len(app.ARCHIVE_PREFIX):])
+    if selected:
+        df_all = pd.concat([df_all] + [data.get(tab, app.COLUMNS_DATA, typed=True) for tab in selected], ignore_index=True)
+    app.render_paged_grid(df_all, key="grid_hist")
@@ -0,0 +1,71 @@
+"""Import Excel des nouvelles réceptions (ajout à la suite de DATA)."""
+import pandas as pd
+import streamlit as st
+from datetime import datetime
+
+
+def render(app, data):
+    st.title("📥 Import des nouvelles réceptions")
+    st.info("Mode : **Ajouter à la suite**. Contrôle des doublons activé sur le champ `NumReception`.")
+
+    with st.expander("📝 Détails de l'importation"):
+        st.write("Le système applique les règles suivantes :")
+        st.markdown("- **Contrôle Doublon** : Une ligne dont le numéro existe déjà (en base ou plus haut dans le fichier) est rejetée.")
+        st.markdown("- **Contrôle des formats** : `Mt TTC`, `Qté` et `Livré le` doivent être lisibles, sinon la ligne est rejetée.")
+        st.markdown("- **Correspondance automatique** : La colonne `N°` devient `NumReception`.")
+        st.markdown("- **Statut automatique** : Chaque ligne est marquée comme `À déballer`.")
+        st.markdown("- **Champs vides** : Les colonnes Emplacement, Déballage et Litiges sont initialisées vides.")
+        st.markdown("- **Rapport** : Seules les lignes acceptées sont ajoutées ; le détail ligne par ligne est téléchargeable.")
+
+    uploaded_file = st.file_uploader("Choisir un fichier Excel", type=['xlsx', 'xls'])
+
+    if uploaded_file:
+        try:
+            # Aperçu : seul le premier paquet est lu
+            total, chunks = app.iter_excel_chunks(uploaded_file, chunk_size=10)
+            preview = next(chunks, pd.DataFrame())
+            st.write(f"🔍 Aperçu du fichier chargé ({total if total is not None else '?'} lignes) :")
+            st.dataframe(preview.head())
+            
+            if st.button("🚀 Lancer l'importation (Ajouter à la suite)"):
+                progress = st.progress(0.0, text="Lecture et contrôle du fichier...")
+                def _on_progress(done, total):
+                    ratio = min(done / total, 1.0) if total else 0.0
+                    progress.progress(ratio, text=f"Contrôle : {done} ligne(s) traitée(s)" + (f" sur {total}" if total else ""))
+                
+                # Index des NumReception déjà présents, archives comprises (mis en cache avec les onglets)
+                existing_nums = app.get_reception_keys()
+                df_accepted, report = app.import_excel_file(uploaded_file, existing_nums, on_progress=_on_progress)
+                progress.progress(1.0, text="Contrôle terminé.")
+                
+                rejected = report[report['Résultat'] == app.IMPORT_REJECTED]
+                c1, c2 = st.columns(2)
+                c1.metric("Lignes acceptées", len(df_accepted))
+                c2.metric("Lignes rejetées", len(rejected))
+                if not rejected.empty:
+                    st.warning("Motifs de rejet : " + ", ".join(f"{m} ({n})" for m, n in rejected['Motif'].value_counts().items()))
+                    st.dataframe(rejected.head(200), hide_index=True)
+                st.download_button("📄 Télécharger le rapport d'import", app.to_excel(report), file_name="rapport_import.xlsx")
+                
+                if df_accepted.empty:
+                    st.error("❌ Aucune ligne à importer.")
+                # Ajout à la suite : seules les lignes acceptées sont envoyées
+                elif app.append_rows_gsheet(app.WS_DATA, df_accepted):
+                    st.success(f"✅ Importation réussie ! {len(df_accepted)} nouvelles lignes ajoutées.")
+                    st.balloons()
+                    # Forcer le rafraîchissement
+                    st.session_state['last_import_time'] = datetime.now()
+                else:
+                    st.error("❌ Échec de la sauvegarde sur Google Sheets.")
+        except Exception as e:
+            st.error(f"❌ Erreur lors du traitement : {e}")
+
+    # Section Historique
+    st.divider()
+    st.subheader("📋 Historique des réceptions (Base DATA)")
+    with st.spinner("Chargement de l'historique..."):
+        df_history = data.get(app.WS_DATA, app.COLUMNS_DATA)
+        if not df_history.empty:
+            app.render_paged_grid(df_history.iloc[::-1], key="grid_import_hist")
+        else:
+            st.info("Aucune donnée dans la base DATA.")
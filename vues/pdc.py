@@ -0,0 +1,62 @@
+"""PDC (pas de commande) : signalement, notification de l'acheteur et historique."""
+import streamlit as st
+from st_aggrid import AgGrid
+from datetime import datetime
+
+
+def render(app, data):
+    st.title("📦 PDC - Pas De Commande")
+    contacts_map = app.load_mail_list_v2()
+    liste_labels = list(contacts_map.keys())
+
+    with st.form("form_pdc", clear_on_submit=True):
+        st.subheader("Signaler une réception sans commande")
+        c1, c2 = st.columns(2)
+        with c1:
+            p_fourn = st.text_input("Fournisseur")
+            p_bl = st.text_input("Numéro du BL")
+            p_date = st.date_input("Date Réception Physique", datetime.now())
+        with c2:
+            p_label_acheteur = st.selectbox("Acheteur", options=[""] + liste_labels)
+            p_comment = st.text_area("Commentaire (optionnel)", help="Précisions pour l'acheteur")
+        
+        st.divider()
+        st.info("ℹ️ La pièce jointe est obligatoire pour signaler un PDC.")
+        p_file = st.file_uploader("Joindre le BL (Obligatoire)", type=["jpg", "png", "pdf", "xlsx"])
+        
+        submit_pdc = st.form_submit_button("📧 Envoyer l'alerte PDC")
+        
+        if submit_pdc:
+            if not p_file:
+                st.error("⚠️ Vous devez obligatoirement joindre une pièce jointe (scan du BL).")
+            elif p_fourn and p_bl and p_label_acheteur:
+                with st.spinner("Traitement du PDC..."):
+                    mail_acheteur = contacts_map[p_label_acheteur]
+                    nom_acheteur = p_label_acheteur.split(" (")[0]
+                    
+                    # Ajout GSheet : Fournisseur, NuméroBL, Commentaire_PDC , Date, Acheteur, mail, date_relance, nb_relance
+                    row_pdc = [p_fourn, p_bl, str(p_date), p_comment, nom_acheteur, mail_acheteur, str(datetime.now().date()), 0]
+                    
+                    if app.add_row_gsheet(app.WS_PDC, row_pdc):
+                        app.get_outbox().submit(
+                            kind="pdc",
+                            label=f"PDC {p_fourn} / BL {p_bl} → {nom_acheteur}",
+                            recipients=[mail_acheteur],
+                            subject=f"PDC - BL {p_bl} - {p_fourn}",
+                            content_args=dict(magasin="", fournisseur=p_fourn, bl=p_bl, commentaire=p_comment, mode="pdc"),
+                            attachment=p_file
+                        )
+                        st.success(f"✅ PDC enregistré. Alerte acheteur : {app.STATUS_SENDING}.")
+                        st.balloons()
+                    else:
+                        st.error("❌ Erreur lors de l'enregistrement GSheet.")
+            else:
+                st.error("⚠️ Veuillez remplir le fournisseur, le BL et l'acheteur.")
+
+    app.render_outbox_status("pdc")
+
+    st.divider()
+    st.subheader("📋 Historique PDC")
+    df_pdc = data.get(app.WS_PDC, app.COLUMNS_PDC)
+    if not df_pdc.empty:
+        AgGrid(df_pdc, gridOptions=app.get_standard_grid_options(df_pdc), height=400, theme='balham', key="grid_pdc")
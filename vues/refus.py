@@ -0,0 +1,91 @@
+"""Déclaration de refus de marchandise, notification et historique."""
+import streamlit as st
+from datetime import datetime
+
+
+def render(app, data):
+    st.title("🚚 Déclaration de Refus")
+
+    # Pré-chargement des contacts
+    contacts_map = app.load_mail_list_v2()
+    liste_labels = list(contacts_map.keys())
+
+    with st.form("main_form_refus", clear_on_submit=True):
+        st.subheader("Détails de la livraison")
+        col1, col2 = st.columns(2)
+        with col1:
+            f_magasin = st.selectbox("Magasin", ["BAYONNE", "BIDART", "URRUGNE", "PMI"])
+            f_date = st.date_input("Date du refus", datetime.now())
+        with col2:
+            f_fourn = st.text_input("Fournisseur")
+            f_bl = st.text_input("Numéro de BL")
+        
+        st.divider()
+        
+        # Gestion des mails
+        f_emails_choisis = []
+        if not liste_labels:
+            st.warning("⚠️ Aucun contact trouvé dans 'MAIL'.")
+            f_manual = st.text_input("Saisir emails manuels (séparés par virgule) :")
+            f_emails_choisis = [e.strip() for e in f_manual.split(",") if "@" in e]
+        else:
+            selection = st.multiselect(
+                "Destinataires :",
+                options=liste_labels,
+                help="Sélectionnez les noms ou tapez un mail + Entrée."
+            )
+            for item in selection:
+                if item in contacts_map:
+                    f_emails_choisis.append(contacts_map[item])
+                elif "@" in item:
+                    f_emails_choisis.append(item.strip())
+        
+        f_comment = st.text_area("Commentaire / Motif")
+        f_file = st.file_uploader("Preuve / Photo", type=["jpg", "png", "pdf"])
+        
+        # Bouton de validation (OBLIGATOIRE DANS LE FORM)
+        submit = st.form_submit_button("🚀 Enregistrer et Envoyer")
+        
+        if submit:
+            if f_fourn and f_bl and f_emails_choisis:
+                with st.spinner("Traitement logistique..."):
+                    row = [f_magasin, str(f_date), f_fourn, f_bl, f_comment]
+                    if app.add_row_gsheet(app.WS_REFUS, row):
+                        # Rédaction et envoi du mail en arrière-plan : le formulaire rend la main
+                        app.get_outbox().submit(
+                            kind="refus",
+                            label=f"Refus {f_fourn} / BL {f_bl}",
+                            recipients=f_emails_choisis,
+                            subject=f"REFUS MARCHANDISE : {f_fourn}",
+                            content_args=dict(magasin=f_magasin, fournisseur=f_fourn, bl=f_bl, commentaire=f_comment, mode="refus"),
+                            attachment=f_file
+                        )
+                        st.balloons()						
+                        st.success(f"✅ Refus enregistré. Mail : {app.STATUS_SENDING}.")
+                        st.toast("Remise à zéro du formulaire...", icon="🔄")
+                    else:
+                        st.error("❌ Erreur lors de l'enregistrement GSheet.")
+            else:
+                st.error("⚠️ Veuillez remplir le Fournisseur, le BL et au moins un destinataire.")
+
+    app.render_outbox_status("refus")
+
+    # Affichage de l'historique
+    st.divider()
+    st.subheader("📜 Historique des refus")
+    st.info("💡 Utilisez la recherche et le tri au-dessus du tableau pour filtrer.")
+    df_refus = data.get(app.WS_REFUS, app.COLUMNS_REFUS)        
+    if not df_refus.empty:
+        # Extraction EXCEL rapide
+        excel_data = app.to_excel(df_refus)
+        st.download_button(
+            label="📥 Extraire les données (EXCEL)",
+            data=excel_data,
+            file_name=f'refus_logistique_{datetime.now().strftime("%Y%m%d")}.xlsx',
+            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+        
+        # --- 2. EMPLACEMENT UTILISATION ---
+        app.render_paged_grid(df_refus, key="grid_refus", height=600)
+    else:
+        st.info("Aucun refus enregistré.")
@@ -0,0 +1,28 @@
+"""Relances PDC groupées par acheteur."""
+import streamlit as st
+
+
+def render(app, data):
+    st.title("🔔 Relances PDC")
+    interval = app.get_setting("relance_interval_days", app.RELANCE_INTERVAL_DAYS)
+    st.info(f"Un mail récapitulatif par acheteur pour les BL sans commande non relancés depuis {interval} jour(s).")
+
+    df_pdc = data.get(app.WS_PDC, app.COLUMNS_PDC).iloc[::-1]
+    due = app.select_pdc_due(df_pdc, None, interval, app.get_setting("relance_max", app.RELANCE_MAX))
+    if due.empty:
+        st.success("✅ Aucune relance à envoyer.")
+    else:
+        st.write(f"**{len(due)}** BL à relancer pour **{due['mail acheteur'].str.strip().str.lower().nunique()}** acheteur(s).")
+        st.dataframe(due[app.COLUMNS_PDC], use_container_width=True, hide_index=True)
+        if st.button("📧 Envoyer les relances", type="primary"):
+            with st.spinner("Envoi des relances..."):
+                try:
+                    results = app.run_pdc_relances()
+                except Exception as e:
+                    st.error(f"❌ Erreur lors des relances : {e}")
+                    results = []
+            for acheteur, mail, nb, success, detail in results:
+                if success:
+                    st.success(f"✅ {acheteur} ({mail}) : {nb} BL relancé(s).")
+                else:
+                    st.error(f"❌ {acheteur} ({mail}) : {detail}")
@@ -0,0 +1,53 @@
+"""Suivi transport : saisie d'une livraison et historique."""
+import streamlit as st
+from st_aggrid import AgGrid
+
+
+def render(app, data):
+    st.title("🚛 Arrivée d'un transporteur")
+
+    # Numéro indicatif : le numéro définitif est réservé à la validation
+    next_id = app.peek_transport_id()
+
+    with st.form("form_transport", clear_on_submit=True):
+        st.subheader(f"Saisie Transport n°{next_id}")
+        c1, c2 = st.columns(2)
+        with c1:
+            t_magasin = st.selectbox("Magasin", ["BAYONNE", "BIDART", "URRUGNE", "PMI"], key="t_mag")
+            t_nom = st.text_input("Nom du Transporteur")
+            t_palettes = st.number_input("Nombre de palettes", min_value=0, step=1)
+        with c2:
+            t_poids = st.number_input("Poids total (kg)", min_value=0.0, step=0.5)
+            t_abime = st.selectbox("Colis abîmé ou ouvert ?", ["NON", "OUI"])
+            t_litige = st.selectbox("Litige à la réception ?", ["NON", "OUI"])
+        
+        t_comment = st.text_area("Commentaire Livraison")
+        
+        submit_t = st.form_submit_button("🏁 Valider l'arrivée")
+        
+        if submit_t:
+            if t_nom:
+                with st.spinner("Enregistrement transporteur..."):
+                    next_id = app.allocate_transport_id()
+                    if next_id is not None:
+                        row_t = [next_id, t_magasin, t_nom, t_palettes, t_poids, t_comment, t_abime, t_litige]
+                        if app.add_row_gsheet(app.WS_TRANSPORT, row_t):
+                            st.balloons()							
+                            st.success(f"✅ Transport n°{next_id} enregistré !")
+                            st.rerun()
+
+                        else:
+                            st.error("❌ Erreur lors de l'enregistrement.")
+            else:
+                st.error("⚠️ Veuillez saisir le nom du transporteur.")					
+
+    st.divider()
+    st.subheader("📜 Historique des Transports")
+
+    # Chargement propre des données pour l'historique
+    df_historique = data.get(app.WS_TRANSPORT, app.COLUMNS_TRANSPORT)
+
+    if not df_historique.empty:
+        AgGrid(df_historique, gridOptions=app.get_standard_grid_options(df_historique), height=400, theme='balham', key="grid_t_page_final")
+    else:
+        st.info("Aucun transport dans l'historique.")